@@ -0,0 +1,256 @@
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from simiam.geometry import Pose2D, Surface2D
+from simiam.simulator import Physics, Simulator
+from worlds import generate_world, generate_polygon, write_world
+
+
+TIME_STEP = timedelta(milliseconds=10)
+
+ROBOT_COUNTS = [1, 10, 100, 1000]
+OBSTACLE_COUNTS = [10, 100, 1000, 10000]
+
+# the parallel simulator only pays off for many robots
+PARALLEL_ROBOT_COUNTS = [100, 1000]
+
+
+class _NullWriter(object):
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def measure(func, min_time=0.2, repeats=5):
+    """
+    Return the median time of one call to func, in seconds.
+
+    The number of calls per sample is increased until a sample takes at
+    least min_time / repeats, like timeit's autorange.
+    """
+    number = 1
+    while True:
+        start = time.time()
+        for _ in xrange(number):
+            func()
+        elapsed = time.time() - start
+        if elapsed >= min_time / repeats or number >= 1 << 20:
+            break
+        number *= 10
+
+    samples = [elapsed / number]
+    for _ in xrange(repeats - 1):
+        start = time.time()
+        for _ in xrange(number):
+            func()
+        samples.append((time.time() - start) / number)
+
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def _surface_pairs(num_points, overlapping):
+    rng = random.Random(num_points)
+    distance = 0.1 if overlapping else 10.0
+    a = Surface2D(Pose2D(), generate_polygon(rng, num_points, 0.2))
+    b = Surface2D(Pose2D(), generate_polygon(rng, num_points, 0.2, distance, 0))
+    return a, b
+
+
+def bench_import(module):
+    # a fresh interpreter each time, as for a short-lived worker process
+    command = [sys.executable, '-c', 'import {}'.format(module)]
+    return lambda: subprocess.check_call(command)
+
+
+def bench_intersection_with_surface(num_points):
+    a, b = _surface_pairs(num_points, True)
+    return lambda: a.intersection_with_surface(b)
+
+
+def bench_precheck_surface(num_points):
+    a, b = _surface_pairs(num_points, False)
+    return lambda: a.precheck_surface(b)
+
+
+def bench_apply_physics(num_robots, num_obstacles):
+    physics = Physics(generate_world(num_robots, num_obstacles))
+    return physics.apply_physics
+
+
+def bench_supervisors(num_robots, num_obstacles):
+    world = generate_world(num_robots, num_obstacles)
+    Physics(world).apply_physics()
+
+    def run():
+        for supervisor in world.controllers:
+            supervisor.execute(TIME_STEP)
+    return run
+
+
+def bench_supervisor_batch(num_robots, num_obstacles):
+    from simiam.controllers.batch import SupervisorBatch
+
+    world = generate_world(num_robots, num_obstacles)
+    Physics(world).apply_physics()
+    batch = SupervisorBatch(world.controllers)
+    return lambda: batch.execute(TIME_STEP)
+
+
+def bench_simulator_step(num_robots, num_obstacles):
+    simulator = Simulator(generate_world(num_robots, num_obstacles), TIME_STEP)
+    return simulator.step
+
+
+def _world_file(num_robots, num_obstacles):
+    filename = os.path.join(tempfile.gettempdir(), 'simiam-bench-{}-{}.xml'.format(num_robots, num_obstacles))
+    write_world(generate_world(num_robots, num_obstacles), filename)
+    return filename
+
+
+def bench_serial_step(num_robots, num_obstacles):
+    from simiam.headless import create_simulator
+
+    # the same world as bench_parallel_step, loaded the same way
+    simulator = create_simulator(_world_file(num_robots, num_obstacles), TIME_STEP)
+    return simulator.step
+
+
+def bench_parallel_step(num_robots, num_obstacles, workers):
+    from simiam.parallel import ParallelSimulator
+
+    # the worker processes are daemons, and go when the benchmarks finish
+    simulator = ParallelSimulator(_world_file(num_robots, num_obstacles), TIME_STEP, workers)
+    return simulator.step
+
+
+def benchmarks(full=False):
+    """Yield (name, setup) pairs; setup() returns the callable to time."""
+    for module in ['simiam.geometry', 'simiam.simulator', 'simiam.headless']:
+        yield 'startup.import[{}]'.format(module), lambda module=module: bench_import(module)
+
+    for n in [4, 7, 16, 64]:
+        yield 'geometry.intersection_with_surface[points={}]'.format(n), lambda n=n: bench_intersection_with_surface(n)
+        yield 'geometry.precheck_surface[points={}]'.format(n), lambda n=n: bench_precheck_surface(n)
+
+    if full:
+        scales = [(r, o) for r in ROBOT_COUNTS for o in OBSTACLE_COUNTS]
+    else:
+        scales = [(r, 100) for r in ROBOT_COUNTS] + [(10, o) for o in OBSTACLE_COUNTS if o != 100]
+
+    cases = [
+        ('physics.apply_physics', bench_apply_physics),
+        ('controllers.k3_supervisor', bench_supervisors),
+        ('controllers.supervisor_batch', bench_supervisor_batch),
+        ('simulator.step', bench_simulator_step)
+    ]
+
+    for name, setup in cases:
+        for robots, obstacles in scales:
+            yield (
+                '{}[robots={},obstacles={}]'.format(name, robots, obstacles),
+                lambda setup=setup, r=robots, o=obstacles: setup(r, o))
+
+    # ParallelSimulator against Simulator on the same worlds
+    for robots in PARALLEL_ROBOT_COUNTS:
+        yield 'parallel.serial_step[robots={}]'.format(robots), lambda r=robots: bench_serial_step(r, 100)
+        for workers in sorted(set([2, multiprocessing.cpu_count()])):
+            yield (
+                'parallel.parallel_step[robots={},workers={}]'.format(robots, workers),
+                lambda r=robots, w=workers: bench_parallel_step(r, 100, w))
+
+
+def run(pattern=None, full=False, min_time=0.2, repeats=5):
+    results = {}
+
+    for name, setup in benchmarks(full):
+        if pattern is not None and pattern not in name:
+            continue
+
+        # Physics prints every collision; keep that out of the timings.
+        stdout = sys.stdout
+        sys.stdout = _NullWriter()
+        try:
+            seconds = measure(setup(), min_time, repeats)
+        finally:
+            sys.stdout = stdout
+
+        results[name] = {'seconds': seconds}
+        print '{:70} {:12.3f} us'.format(name, seconds * 1e6)
+        sys.stdout.flush()
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': results
+    }
+
+
+def compare(report, baseline, threshold):
+    """Return the names of benchmarks that are slower than baseline by more than threshold."""
+    regressions = []
+
+    for name in sorted(report['results']):
+        if name not in baseline['results']:
+            continue
+
+        before = baseline['results'][name]['seconds']
+        after = report['results'][name]['seconds']
+        change = (after - before) / before
+
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print '{:70} {:+7.1%}{}'.format(name, change, flag)
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Sim.I.am benchmarks.')
+    parser.add_argument('-k', '--filter', help='only run benchmarks whose name contains this string')
+    parser.add_argument('--full', action='store_true', help='run every combination of robot and obstacle counts')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum time spent on each benchmark, in seconds')
+    parser.add_argument('--repeats', type=int, default=5, help='number of samples per benchmark')
+    parser.add_argument('-o', '--output', help='write the results to this file as JSON')
+    parser.add_argument('-c', '--compare', help='compare the results against this baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as a regression (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    report = run(args.filter, args.full, args.min_time, args.repeats)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        print
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print '{} benchmark(s) regressed by more than {:.0%}'.format(len(regressions), args.threshold)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
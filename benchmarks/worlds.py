@@ -0,0 +1,78 @@
+
+import random
+from math import pi, sqrt, sin, cos
+from simiam.geometry import Pose2D
+from simiam.simulator import World
+from simiam.applications.demo import DemoApp
+from simiam.worldfile import Blueprint, write_xml
+
+
+ROBOT_SPACING = 0.4
+
+
+def generate_world(num_robots, num_obstacles, seed=0):
+    """
+    Build a World with num_robots Khepera3s on a lattice in the middle of the
+    arena and num_obstacles random squares scattered around them.
+
+    The obstacle field grows with the number of obstacles so that its
+    density stays roughly that of settings.xml.
+    """
+    rng = random.Random(seed)
+
+    world = World()
+    world.application = DemoApp()
+
+    columns = int(max(1, round(sqrt(num_robots))))
+    offset = (columns - 1) * ROBOT_SPACING / 2
+
+    for i in xrange(num_robots):
+        row, column = divmod(i, columns)
+        pose = Pose2D(column * ROBOT_SPACING - offset, row * ROBOT_SPACING - offset, rng.uniform(-pi, pi))
+        world.add_robot('Khepera3', 'khepera3.K3Supervisor', pose)
+
+    keep_out = offset + ROBOT_SPACING
+    half_size = keep_out + sqrt(num_obstacles) * 0.5
+
+    while len(world.obstacles) < num_obstacles:
+        x = rng.uniform(-half_size, half_size)
+        y = rng.uniform(-half_size, half_size)
+
+        # leave the robot lattice clear so that nobody starts in a crash
+        if abs(x) < keep_out and abs(y) < keep_out:
+            continue
+
+        size = rng.uniform(0.05, 0.3)
+        geometry = [(0, 0), (size, 0), (size, size), (0, size)]
+        world.add_obstacle(Pose2D(x, y, rng.uniform(0, pi / 2)), geometry)
+
+    return world
+
+
+def write_world(world, filename):
+    """
+    Write a world made by generate_world to an XML world file, for the
+    simulators that load their own copy.
+    """
+    robots = []
+    for robot in world.robots:
+        pose = robot.get_pose()
+        robots.append({'type': 'Khepera3', 'supervisor': 'khepera3.K3Supervisor', 'pose': (pose.x, pose.y, pose.theta)})
+
+    offsets = [0]
+    vertices = []
+    for obstacle in world.obstacles:
+        vertices.extend(obstacle.geometry)
+        offsets.append(len(vertices))
+
+    poses = [(0.0, 0.0, 0.0)] * len(world.obstacles)
+    write_xml(Blueprint('DemoApp', robots, poses, offsets, vertices), filename)
+
+
+def generate_polygon(rng, num_points, radius, x=0, y=0):
+    """A random star-shaped polygon around (x, y)."""
+    points = []
+    for angle in sorted(rng.uniform(0, 2 * pi) for _ in xrange(num_points)):
+        r = rng.uniform(radius / 2, radius)
+        points.append((x + r * cos(angle), y + r * sin(angle)))
+    return points
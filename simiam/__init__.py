@@ -1,2 +1,5 @@
+from lazy import lazy_package
 
-from ui import AppWindow
+# Tk and PIL are only needed by the UI, so AppWindow is imported the first
+# time it is asked for rather than with the package.
+lazy_package(__name__, {'AppWindow': 'ui:AppWindow'})
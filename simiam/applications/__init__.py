@@ -1,2 +1,3 @@
+from ..lazy import lazy_package
 
-from demo import DemoApp
+lazy_package(__name__, {'DemoApp': 'demo:DemoApp'})
@@ -10,6 +10,12 @@ class DemoApp(object):
     def add_controller(self, controller):
         self._controllers.append(controller)
 
+    def get_state(self):
+        return self._time
+
+    def set_state(self, state):
+        self._time = state
+
     def run(self, time_delta):
         controller = self._controllers[0]
         if controller.reached_goal:
@@ -1,2 +1,3 @@
+from ..lazy import lazy_package
 
-import khepera3
+lazy_package(__name__, {'khepera3': 'khepera3'})
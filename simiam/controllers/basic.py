@@ -6,7 +6,15 @@ class Controller(object):
     def __init__(self, type):
         self._type = type
 
+    def get_state(self):
+        return None
 
+    def set_state(self, state):
+        pass
+
+
+# batch.SupervisorBatch evaluates this controller for many robots at once;
+# any change to it must be mirrored there.
 class AvoidObstacles(Controller):
     def __init__(self):
         Controller.__init__(self, 'avoid_obstacles')
@@ -71,6 +79,20 @@ class GoToGoal(Controller):
         self._e_k = 0
         self._e_k_1 = 0
 
+    def get_gains(self):
+        return (self._k_p, self._k_i, self._k_d)
+
+    def set_gains(self, k_p, k_i, k_d):
+        self._k_p = k_p
+        self._k_i = k_i
+        self._k_d = k_d
+
+    def get_state(self):
+        return (self._e_k, self._e_k_1)
+
+    def set_state(self, state):
+        self._e_k, self._e_k_1 = state
+
     def execute(self, robot, state_estimate, time_delta, **inputs):
         """
         Compute the left and right wheel speeds for go-to-goal.
@@ -126,6 +148,8 @@ class GoToGoal(Controller):
         }        
 
 
+# batch.SupervisorBatch evaluates this controller for many robots at once;
+# any change to it must be mirrored there.
 class AOAndGTG(Controller):
     def __init__(self):
         Controller.__init__(self, 'ao_and_gtg')
@@ -140,6 +164,19 @@ class AOAndGTG(Controller):
         self._E_k = 0
         self._e_k_1 = 0
 
+    def get_gains(self):
+        return (self._Kp, self._Ki, self._Kd)
+
+    def set_gains(self, k_p, k_i, k_d):
+        self._Kp = k_p
+        self._Ki = k_i
+        self._Kd = k_d
+
+    def get_state(self):
+        return (self._E_k, self._e_k_1)
+
+    def set_state(self, state):
+        self._E_k, self._e_k_1 = state
 
     def execute(self, robot, state_estimate, time_delta, **inputs):
         # Set the goal location
@@ -204,15 +241,12 @@ class AOAndGTG(Controller):
     def _closest_obstacle(self, robot, state_estimate):    
         # Interpret the IR sensor measurements geometrically
         
-        ir_values = [max(x.get_range(), 18) for x in robot.ir_sensors]
-
         raw_to_distance = lambda raw: (log(raw / 3960) / -30) + 0.02
 
-        ir_vectors = [[raw_to_distance(x), 0] for x in ir_values]
-
-        # make sure that the rear IRs are ignored.
-        for i in [0, 7, 8]:
-            ir_vectors[i][0] = 0.3
+        # make sure that the rear IRs are ignored; they are not even read,
+        # so that their ranges need not be computed
+        ir_vectors = [[0.3 if i in [0, 7, 8] else raw_to_distance(max(x.get_range(), 18)), 0]
+                      for i, x in enumerate(robot.ir_sensors)]
 
         ir_vectors = [v for x in zip(self._sensor_poses, ir_vectors) for v in x[0].transform([x[1]])]
         ir_vectors = Pose2D(theta=state_estimate.theta).transform(ir_vectors)
@@ -0,0 +1,147 @@
+import numpy as np
+from math import sin, cos
+from basic import AvoidObstacles, AOAndGTG
+from khepera3 import K3Supervisor
+
+
+class SupervisorBatch(object):
+    """
+    Executes a list of supervisors, evaluating their controllers together.
+
+    The K3Supervisors that are running AvoidObstacles or AOAndGTG and are
+    not at their goal are grouped by controller. For each group the IR
+    readings are gathered into one array, and the conversion to distances,
+    the obstacle and goal headings, their blending and the heading PID run
+    as array operations over the whole group, in the same order as the
+    scalar controllers. The results equal theirs to within rounding, as
+    NumPy's trigonometric functions may differ from math's in the last bit;
+    the controllers' state is read and written through get_state and
+    set_state. Changes to AvoidObstacles and AOAndGTG must be mirrored here.
+    The wheel speeds are then set through set_wheel_speeds and the odometry
+    updated robot by robot as usual. Every other supervisor is executed on
+    its own.
+    """
+
+    def __init__(self, supervisors):
+        self._supervisors = list(supervisors)
+
+        # the rotations of the sensor poses, as Pose2D.transform computes them
+        thetas = [x.theta for x in AOAndGTG()._sensor_poses]
+        self._sensor_cos = np.array([cos(x) for x in thetas])
+        self._sensor_sin = np.array([sin(x) for x in thetas])
+        self._gains = [2 * x for x in [0, 1, 4, 5, 5, 4, 1, 0, 0]]
+
+    def __len__(self):
+        return len(self._supervisors)
+
+    def execute(self, time_delta):
+        """Equivalent of calling execute(time_delta) on every supervisor."""
+        groups = {AvoidObstacles: [], AOAndGTG: []}
+        sensor_count = len(self._gains)
+
+        for supervisor in self._supervisors:
+            group = None
+            if isinstance(supervisor, K3Supervisor) and len(supervisor._robot.ir_sensors) == sensor_count:
+                group = groups.get(type(supervisor._current_controller))
+
+            if group is None or supervisor.is_at_goal(supervisor._state_estimate):
+                supervisor.execute(time_delta)
+            else:
+                group.append(supervisor)
+
+        if groups[AvoidObstacles]:
+            self._execute_group(groups[AvoidObstacles], self._avoid_obstacles, time_delta)
+        if groups[AOAndGTG]:
+            self._execute_group(groups[AOAndGTG], self._ao_and_gtg, time_delta)
+
+    def _execute_group(self, supervisors, controller, time_delta):
+        robots = [x._robot for x in supervisors]
+        estimates = np.array([(e.x, e.y, e.theta) for e in (x._state_estimate for x in supervisors)])
+
+        v = np.array([x.v for x in supervisors], dtype=float)
+        w = controller(supervisors, robots, estimates, time_delta)
+
+        # DifferentialDrive.uni_to_diff
+        R = np.array([x.wheel_radius for x in robots])
+        L = np.array([x.wheel_base_length for x in robots])
+        w_r = v / R + (w * L) / (2 * R)
+        w_l = v / R - (w * L) / (2 * R)
+
+        for supervisor, robot, vel_r, vel_l in zip(supervisors, robots, w_r.tolist(), w_l.tolist()):
+            robot.set_wheel_speeds(vel_r, vel_l)
+            supervisor._update_odometry()
+
+    def _ir_vectors(self, robots, estimates, ignored):
+        # the IR readings as vectors in the world frame, with the ignored
+        # sensors left unread at 0.3m
+        n = len(robots)
+        read = [i for i in xrange(len(self._gains)) if i not in ignored]
+
+        raw = np.array([[r.ir_sensors[i].get_range() for i in read] for r in robots], dtype=float).reshape(n, len(read))
+        distances = np.empty((n, len(self._gains)))
+        distances[:, ignored] = 0.3
+        distances[:, read] = np.log(np.maximum(raw, 18) / 3960) / -30 + 0.02
+
+        x = self._sensor_cos * distances - self._sensor_sin * 0
+        y = self._sensor_sin * distances + self._sensor_cos * 0
+
+        c_t = np.cos(estimates[:, 2])[:, None]
+        s_t = np.sin(estimates[:, 2])[:, None]
+        return c_t * x - s_t * y, s_t * x + c_t * y
+
+    def _weighted_sum(self, x, y):
+        # summed one sensor at a time, in the order of the scalar sum
+        u_1 = 0
+        u_2 = 0
+        for i, g in enumerate(self._gains):
+            u_1 = u_1 + g * x[:, i]
+            u_2 = u_2 + g * y[:, i]
+        return u_1, u_2
+
+    def _avoid_obstacles(self, supervisors, robots, estimates, time_delta):
+        # AvoidObstacles.execute
+        x, y = self._ir_vectors(robots, estimates, [])
+        u_1, u_2 = self._weighted_sum(x, y)
+        norm_u = np.sqrt(u_1 ** 2 + u_2 ** 2)
+        theta_d = np.arctan2(u_2, u_1)
+
+        k_w = 1.75
+        return k_w * norm_u * np.sin(theta_d - estimates[:, 2])
+
+    def _ao_and_gtg(self, supervisors, robots, estimates, time_delta):
+        # AOAndGTG.execute and _closest_obstacle
+        controllers = [x._current_controller for x in supervisors]
+        theta = estimates[:, 2]
+
+        x, y = self._ir_vectors(robots, estimates, [0, 7, 8])
+        d_obs = np.sqrt(x ** 2 + y ** 2).min(axis=1)
+        u_1, u_2 = self._weighted_sum(x, y)
+        theta_obs = np.arctan2(u_2, u_1)
+
+        theta_d_ao = np.arctan2(np.sin(theta_obs), np.cos(theta_obs))
+
+        goals = np.array([x.goal for x in supervisors], dtype=float)
+        theta_d_gtg = np.arctan2(goals[:, 1] - estimates[:, 1], goals[:, 0] - estimates[:, 0])
+
+        d_c = np.array([x.d_c for x in supervisors], dtype=float)
+        d_s = np.array([x.d_s for x in supervisors], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m = -1 / (d_s - d_c)
+            b = 1 - m * d_c
+            alpha = np.where(d_obs >= d_s, 0.0, np.where(d_obs <= d_c, 1.0, m * d_obs + b))
+
+        theta_d = alpha * theta_d_ao + (1 - alpha) * theta_d_gtg
+
+        e_k = theta_d - theta
+        e_k = np.arctan2(np.sin(e_k), np.cos(e_k))
+
+        gains = np.array([x.get_gains() for x in controllers], dtype=float)
+        E_k, e_k_1 = np.array([x.get_state() for x in controllers], dtype=float).reshape(-1, 2).T
+
+        dt = time_delta.total_seconds()
+        w = gains[:, 0] * e_k + gains[:, 1] * (E_k + e_k * dt) + gains[:, 2] * (e_k - e_k_1) / dt
+
+        for controller, state in zip(controllers, zip((E_k + e_k * dt).tolist(), e_k.tolist())):
+            controller.set_state(state)
+
+        return w
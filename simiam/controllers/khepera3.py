@@ -4,6 +4,9 @@ from basic import AvoidObstacles, GoToGoal, AOAndGTG
 from ..geometry import Pose2D
 
 class K3Supervisor(Supervisor):
+    # distance from the goal at which it counts as reached
+    goal_tolerance = 0.02
+
     def __init__(self):
         Supervisor.__init__(self)
 
@@ -23,28 +26,57 @@ class K3Supervisor(Supervisor):
         self.goal = (0, 0)
         self.reached_goal = False
 
+        # cruising speed, and the obstacle distances between which
+        # AOAndGTG blends from going to the goal to avoiding obstacles
+        self.v = 0.1
+        self.d_c = 0.08
+        self.d_s = 0.1
+
+    def set_gains(self, k_p=None, k_i=None, k_d=None):
+        """
+        Set the heading PID gains of the go-to-goal controllers. Gains left
+        as None are unchanged.
+        """
+        for controller in self._controllers:
+            if hasattr(controller, 'set_gains'):
+                gains = [x if x is not None else y for x, y in zip((k_p, k_i, k_d), controller.get_gains())]
+                controller.set_gains(*gains)
+
     def set_current_controller(self, controller_id):
         self._current_controller = self._controllers[controller_id]
 
+    def get_state(self):
+        state = Supervisor.get_state(self)
+        state['prev_ticks'] = dict(self._prev_ticks)
+        state['goal'] = self.goal
+        state['reached_goal'] = self.reached_goal
+        return state
+
+    def set_state(self, state):
+        Supervisor.set_state(self, state)
+        self._prev_ticks = dict(state['prev_ticks'])
+        self.goal = state['goal']
+        self.reached_goal = state['reached_goal']
+
+    def is_at_goal(self, pose):
+        return sqrt((pose.x - self.goal[0]) ** 2 + (pose.y - self.goal[1]) ** 2) <= self.goal_tolerance
+
     def execute(self, time_delta):
         """
         Select and execute the current controller.
 
         See also controller/execute
         """
-        x_distance = self._state_estimate.x - self.goal[0]
-        y_distance = self._state_estimate.y - self.goal[1]
-
-        if sqrt(x_distance ** 2 + y_distance ** 2) > 0.02:
+        if not self.is_at_goal(self._state_estimate):
             outputs = self._current_controller.execute(
                 self._robot,
                 self._state_estimate,
                 time_delta,
                 x_g=self.goal[0],
                 y_g=self.goal[1],
-                v=0.1,
-                d_c=0.08,
-                d_s=0.1)
+                v=self.v,
+                d_c=self.d_c,
+                d_s=self.d_s)
 
             w_r, w_l = self._robot.dynamics.uni_to_diff(outputs['v'], outputs['w'])
             self._robot.set_wheel_speeds(w_r, w_l)
@@ -12,3 +12,23 @@ class Supervisor(object):
     def attach_robot(self, robot, pose):
         self._robot = robot
         self._state_estimate = pose
+
+    def get_state(self):
+        estimate = self._state_estimate
+        return {
+            'state_estimate': (estimate.x, estimate.y, estimate.theta),
+            'current_controller': self._controllers.index(self._current_controller),
+            'controllers': [x.get_state() for x in self._controllers]
+        }
+
+    def set_state(self, state):
+        self._state_estimate = Pose2D(*state['state_estimate'])
+        self._current_controller = self._controllers[state['current_controller']]
+        for controller, controller_state in zip(self._controllers, state['controllers']):
+            controller.set_state(controller_state)
+
+    def get_state_estimate(self):
+        return self._state_estimate
+
+    def get_current_controller_id(self):
+        return self._controllers.index(self._current_controller)
@@ -0,0 +1,161 @@
+from array import array
+from math import floor, sqrt
+
+
+class DistanceField(object):
+    """
+    Signed distance field of a set of static surfaces, sampled at the
+    centres of a regular grid.
+
+    Each cell holds the distance from its centre to the nearest surface edge,
+    negative inside a surface, so the cells with a value of at most half the
+    cell diagonal form a conservative occupancy grid. Distances are
+    truncated at max_distance, which is also assumed everywhere outside the
+    grid.
+    """
+
+    def __init__(self, surfaces, resolution, max_distance=0.5):
+        self.resolution = float(resolution)
+        self.max_distance = float(max_distance)
+
+        # the value at a cell centre is within this of the value anywhere in
+        # the cell, since distances change no faster than position
+        self._slack = self.resolution * sqrt(2) / 2
+
+        if surfaces:
+            boxes = [x.get_bounding_box() for x in surfaces]
+            self._origin = (min(b[0] for b in boxes) - self.max_distance,
+                            min(b[1] for b in boxes) - self.max_distance)
+            width = max(b[2] for b in boxes) + self.max_distance - self._origin[0]
+            height = max(b[3] for b in boxes) + self.max_distance - self._origin[1]
+        else:
+            self._origin = (0.0, 0.0)
+            width = height = 0.0
+
+        self._columns = int(width / self.resolution) + 1
+        self._rows = int(height / self.resolution) + 1
+        self._values = array('d', self._rasterize(surfaces).tolist())
+
+    def distance(self, point):
+        """Return a lower bound on the distance from point to any surface."""
+        i = int(floor((point[0] - self._origin[0]) / self.resolution))
+        j = int(floor((point[1] - self._origin[1]) / self.resolution))
+
+        if i < 0 or j < 0 or i >= self._columns or j >= self._rows:
+            return self.max_distance
+
+        return self._values[j * self._columns + i] - self._slack
+
+    def is_occupied(self, point):
+        """Return whether the cell containing point may overlap a surface."""
+        return self.distance(point) <= 0
+
+    def is_clear(self, point, radius):
+        """Return whether no surface comes within radius of point."""
+        return self.distance(point) > radius
+
+    def trace(self, origin, direction, max_distance):
+        """
+        Sphere-trace the ray from origin in the (unit) direction. Return
+        the distance along it at which it gets within one cell of a surface,
+        or None if it stays clear up to max_distance.
+        """
+        o_x, o_y = origin
+        d_x, d_y = direction
+        t = 0.0
+
+        while t <= max_distance:
+            d = self.distance((o_x + d_x * t, o_y + d_y * t))
+            if d < self.resolution:
+                return t
+            t += d
+
+        return None
+
+    def _rasterize(self, surfaces):
+        # The distances to every edge and the inside tests of every surface,
+        # for all the cells near them at once; NumPy is only needed here.
+        import numpy as np
+
+        values = np.empty(self._columns * self._rows)
+        values.fill(self.max_distance)
+        if not surfaces:
+            return values
+
+        edges = np.array([e for x in surfaces for e in x._edge_set], dtype=float).reshape(-1, 4)
+        x_1, y_1, x_2, y_2 = edges.T
+        boxes = np.column_stack((np.minimum(x_1, x_2), np.minimum(y_1, y_2), np.maximum(x_1, x_2), np.maximum(y_1, y_2)))
+
+        for k, cells, x, y in self._cell_pairs(boxes, self.max_distance, np.ones(len(edges), int)):
+            # distance to the closest point on the segment
+            e_x = x_2[k] - x_1[k]
+            e_y = y_2[k] - y_1[k]
+            length_squared = e_x * e_x + e_y * e_y
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                u = np.minimum(np.maximum(((x - x_1[k]) * e_x + (y - y_1[k]) * e_y) / length_squared, 0.0), 1.0)
+            u[length_squared == 0] = 0.0
+
+            d = np.sqrt((x - x_1[k] - u * e_x) ** 2 + (y - y_1[k] - u * e_y) ** 2)
+            np.minimum.at(values, cells, d)
+
+        # a cell is inside when its centre is inside any surface, by the
+        # crossing test of Surface2D.contains_point over every edge
+        edge_counts = np.array([len(x._edge_set) for x in surfaces])
+        edge_offsets = np.cumsum(edge_counts) - edge_counts
+        surface_boxes = np.array([x.get_bounding_box() for x in surfaces], dtype=float)
+        inside = np.zeros(len(values), bool)
+
+        for k, cells, x, y in self._cell_pairs(surface_boxes, 0, edge_counts):
+            counts = edge_counts[k]
+            pair = np.repeat(np.arange(len(k)), counts)
+            e = edge_offsets[k][pair] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            p_x = x[pair]
+            p_y = y[pair]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossing = ((y_1[e] > p_y) != (y_2[e] > p_y)) & \
+                    (p_x < x_1[e] + (p_y - y_1[e]) * (x_2[e] - x_1[e]) / (y_2[e] - y_1[e]))
+
+            odd = np.bincount(pair, crossing, len(k)) % 2 == 1
+            inside[cells[odd]] = True
+
+        values[inside] = -values[inside]
+        return values
+
+    # upper bound on the number of item-cell pairs handled per batch, to
+    # keep the temporary arrays to a few tens of megabytes
+    _max_batch = 1 << 20
+
+    def _cell_pairs(self, boxes, margin, weights):
+        # Yield batches of (item, cell, x, y) arrays, with a row for each
+        # cell whose centre lies within the bounding box of an item grown by
+        # margin, and the centre of that cell; weights is the cost per cell
+        # of each item.
+        import numpy as np
+
+        h = self.resolution
+        o_x, o_y = self._origin
+
+        min_i = np.maximum(np.floor((boxes[:, 0] - margin - o_x) / h - 0.5).astype(int), 0)
+        min_j = np.maximum(np.floor((boxes[:, 1] - margin - o_y) / h - 0.5).astype(int), 0)
+        max_i = np.minimum(np.floor((boxes[:, 2] + margin - o_x) / h - 0.5).astype(int) + 1, self._columns - 1)
+        max_j = np.minimum(np.floor((boxes[:, 3] + margin - o_y) / h - 0.5).astype(int) + 1, self._rows - 1)
+
+        widths = np.maximum(max_i - min_i + 1, 0)
+        counts = widths * np.maximum(max_j - min_j + 1, 0)
+        ends = np.cumsum(counts * weights)
+
+        start = 0
+        while start < len(boxes):
+            limit = (ends[start - 1] if start > 0 else 0) + self._max_batch
+            end = max(start + 1, np.searchsorted(ends, limit, side='right'))
+
+            batch = counts[start:end]
+            k = np.repeat(np.arange(start, end), batch)
+            local = np.arange(batch.sum()) - np.repeat(np.cumsum(batch) - batch, batch)
+            i = min_i[k] + local % widths[k]
+            j = min_j[k] + local // widths[k]
+
+            yield k, j * self._columns + i, o_x + (i + 0.5) * h, o_y + (j + 0.5) * h
+            start = end
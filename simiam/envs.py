@@ -0,0 +1,221 @@
+import multiprocessing
+import numpy as np
+from datetime import timedelta
+from simulator import World, Simulator, Physics
+
+
+class _Batch(object):
+    """
+    A group of environments stepped one after another in this process, each
+    by its own Simulator.
+    """
+
+    def __init__(self, filename, count, options):
+        self._action_type = options['action_type']
+        self._max_steps = options['max_steps']
+        self._simulators = []
+        self._initial = []
+        self._has_goal = []
+        self._steps = [0] * count
+
+        for _ in xrange(count):
+            world = World()
+            world.build_from_file(filename)
+
+            if options['goal'] is not None:
+                for controller in world.controllers:
+                    controller.goal = options['goal']
+
+            simulator = Simulator(world, options['time_step'], options['physics'], options['fleet'], options['integrator'])
+            self._simulators.append(simulator)
+            self._initial.append(simulator.snapshot())
+
+            # robots that start at their goal have no goal to reach
+            self._has_goal.append([not c.is_at_goal(r.get_pose()) for r, c in zip(world.robots, world.controllers)])
+
+    def reset(self):
+        for i, simulator in enumerate(self._simulators):
+            simulator.restore(self._initial[i])
+            self._steps[i] = 0
+
+        return self._observe()
+
+    def step(self, actions):
+        rewards = np.zeros(len(self._simulators))
+        dones = np.zeros(len(self._simulators), dtype=bool)
+        infos = []
+
+        for i, simulator in enumerate(self._simulators):
+            world = simulator._world
+            for robot, action in zip(world.robots, actions[i]):
+                if self._action_type == 'unicycle':
+                    robot.set_wheel_speeds(*robot.dynamics.uni_to_diff(action[0], action[1]))
+                else:
+                    robot.set_wheel_speeds(action[0], action[1])
+
+            simulator.step(controllers=False)
+            self._steps[i] += 1
+
+            reached_goal = any(self._has_goal[i])
+            for robot, controller, has_goal in zip(world.robots, world.controllers, self._has_goal[i]):
+                if has_goal and controller.is_at_goal(robot.get_pose()):
+                    controller.reached_goal = True
+                elif has_goal:
+                    reached_goal = False
+
+            truncated = self._max_steps is not None and self._steps[i] >= self._max_steps
+            info = {'crashed': simulator.has_crashed, 'reached_goal': reached_goal, 'truncated': truncated}
+
+            if simulator.has_crashed:
+                rewards[i] = -1.0
+            elif reached_goal:
+                rewards[i] = 1.0
+
+            if simulator.has_crashed or reached_goal or truncated:
+                dones[i] = True
+                info['terminal_observation'] = self._observe_one(simulator)
+                simulator.restore(self._initial[i])
+                self._steps[i] = 0
+
+            infos.append(info)
+
+        return self._observe(), rewards, dones, infos
+
+    def _observe(self):
+        observations = [self._observe_one(x) for x in self._simulators]
+        return dict((key, np.array([x[key] for x in observations])) for key in VectorEnv.observation_keys)
+
+    def _observe_one(self, simulator):
+        robots = simulator._world.robots
+        pose = [robot.get_pose() for robot in robots]
+        return {
+            'ir': np.array([[x.get_range() for x in robot.ir_sensors] for robot in robots], dtype=float),
+            'ticks': np.array([[x.ticks for x in robot.encoders] for robot in robots], dtype=float),
+            'pose': np.array([(p.x, p.y, p.theta) for p in pose])
+        }
+
+
+def _worker(connection, filename, count, options):
+    batch = _Batch(filename, count, options)
+
+    while True:
+        command, data = connection.recv()
+        if command == 'step':
+            connection.send(batch.step(data))
+        elif command == 'reset':
+            connection.send(batch.reset())
+        else:
+            break
+
+    connection.close()
+
+
+class VectorEnv(object):
+    """
+    Gym-style batch of num_envs independent copies of the world described
+    by a settings file, with the robots driven by actions instead of their
+    controllers.
+
+    Observations are dicts of arrays indexed by environment and robot: 'ir'
+    holds the proximity sensor readings, 'ticks' the right and left wheel
+    encoder ticks and 'pose' the (x, y, theta) pose. Actions are arrays of
+    shape (num_envs, robots, 2) holding (v, w) for the 'unicycle' action
+    type or the right and left wheel speeds for 'wheels'.
+
+    An environment is done when a robot crashes (reward -1), when every
+    robot is within goal_tolerance of its supervisor's goal (reward 1), or
+    after max_steps steps. The goals are those of the world file unless goal
+    is given; robots that start at their goal, as with the default goal of
+    (0, 0) in settings.xml, are left out, and an environment in which every
+    robot does is never done by reaching the goal. Done environments are
+    reset automatically; the observation they ended with is in their info
+    dict.
+
+    The copies are not batched into shared arrays: each is stepped by its
+    own Simulator, one after another. With processes set, the environments
+    are split between that many worker processes which step their share in
+    parallel, which is the way to scale the throughput.
+    """
+
+    action_types = ['unicycle', 'wheels']
+    observation_keys = ['ir', 'ticks', 'pose']
+
+    def __init__(self, filename, num_envs, time_step=timedelta(milliseconds=10), action_type='unicycle',
+                 goal=None, max_steps=None, processes=None, physics=Physics, fleet=False, integrator=None):
+        if action_type not in self.action_types:
+            raise ValueError('unknown action type: {}'.format(action_type))
+
+        self.num_envs = num_envs
+        options = {
+            'time_step': time_step,
+            'action_type': action_type,
+            'goal': goal,
+            'max_steps': max_steps,
+            'physics': physics,
+            'fleet': fleet,
+            'integrator': integrator
+        }
+
+        self._batch = None
+        self._workers = []
+        self._slices = []
+
+        if not processes:
+            self._batch = _Batch(filename, num_envs, options)
+            return
+
+        processes = min(processes, num_envs)
+        start = 0
+        for i in xrange(processes):
+            count = num_envs // processes + (1 if i < num_envs % processes else 0)
+
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child, filename, count, options))
+            process.daemon = True
+            process.start()
+            child.close()
+
+            self._workers.append((process, connection))
+            self._slices.append(slice(start, start + count))
+            start += count
+
+    def reset(self):
+        """Reset every environment to its initial state; returns the observations."""
+        if self._batch is not None:
+            return self._batch.reset()
+
+        for _, connection in self._workers:
+            connection.send(('reset', None))
+
+        return self._merge_observations([x.recv() for _, x in self._workers])
+
+    def step(self, actions):
+        """
+        Apply actions and advance every environment by one time step.
+        Returns the observations, rewards, done flags and info dicts.
+        """
+        actions = np.asarray(actions, dtype=float)
+
+        if self._batch is not None:
+            return self._batch.step(actions)
+
+        for (_, connection), part in zip(self._workers, self._slices):
+            connection.send(('step', actions[part]))
+
+        results = [x.recv() for _, x in self._workers]
+        observations = self._merge_observations([x[0] for x in results])
+        rewards = np.concatenate([x[1] for x in results])
+        dones = np.concatenate([x[2] for x in results])
+        infos = [info for x in results for info in x[3]]
+        return observations, rewards, dones, infos
+
+    def close(self):
+        for process, connection in self._workers:
+            connection.send(('close', None))
+            connection.close()
+            process.join()
+
+        self._workers = []
+
+    def _merge_observations(self, parts):
+        return dict((key, np.concatenate([x[key] for x in parts])) for key in self.observation_keys)
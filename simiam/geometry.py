@@ -1,5 +1,5 @@
 
-from math import sqrt, sin, cos
+from math import sqrt, sin, cos, ceil, pi
 import operator
 
 
@@ -16,9 +16,100 @@ class Pose2D(object):
         return [(self.x + c_t * p[0] - s_t * p[1], self.y + s_t * p[0] + c_t * p[1]) for p in points]
 
 
+def bounding_boxes_overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def segments_intersect(edge_a, edge_b):
+    # same test as in Surface2D.intersection_with_surface, without computing
+    # the intersection point
+    x_13 = edge_a[0][0] - edge_b[0][0]
+    y_13 = edge_a[0][1] - edge_b[0][1]
+
+    x_21 = edge_a[1][0] - edge_a[0][0]
+    y_21 = edge_a[1][1] - edge_a[0][1]
+
+    x_43 = edge_b[1][0] - edge_b[0][0]
+    y_43 = edge_b[1][1] - edge_b[0][1]
+
+    d_edge_ab = y_43 * x_21 - x_43 * y_21
+    if d_edge_ab == 0:
+        return False
+
+    u_a = (x_43 * y_13 - y_43 * x_13) / d_edge_ab
+    u_b = (x_21 * y_13 - y_21 * x_13) / d_edge_ab
+
+    return u_a >= 0 and u_a <= 1 and u_b >= 0 and u_b <= 1
+
+
+def point_segment_distance(point, edge):
+    (x_1, y_1), (x_2, y_2) = edge
+    e_x = x_2 - x_1
+    e_y = y_2 - y_1
+    length_squared = e_x * e_x + e_y * e_y
+
+    u = 0.0
+    if length_squared > 0:
+        u = min(max(((point[0] - x_1) * e_x + (point[1] - y_1) * e_y) / length_squared, 0.0), 1.0)
+
+    return sqrt((point[0] - x_1 - u * e_x) ** 2 + (point[1] - y_1 - u * e_y) ** 2)
+
+
+def convex_hull(points):
+    """Return the convex hull of points, counter-clockwise (monotone chain)."""
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+
+    upper = []
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+
+    return lower[:-1] + upper[:-1]
+
+
+def interpolate_poses(start, end, t):
+    return Pose2D(
+        start.x + t * (end.x - start.x),
+        start.y + t * (end.y - start.y),
+        start.theta + t * (end.theta - start.theta))
+
+
+def is_convex(points):
+    sign = 0
+    n = len(points)
+
+    for i in xrange(n):
+        a, b, c = points[i], points[(i + 1) % n], points[(i + 2) % n]
+        cross = (b[0] - a[0]) * (c[1] - b[1]) - (b[1] - a[1]) * (c[0] - b[0])
+
+        if cross != 0:
+            if sign != 0 and (cross > 0) != (sign > 0):
+                return False
+            sign = cross
+
+    return True
+
+
 class Surface2D(object):
     def __init__(self, pose, geometry):
+        self.set_geometry(pose, geometry)
+
+    def set_geometry(self, pose, geometry):
         self._original_geometry = geometry
+        # rigid transforms preserve convexity, so this holds for any pose
+        self._is_convex = is_convex(geometry)
         self.set_pose(pose)
 
     def set_pose(self, pose):
@@ -32,10 +123,93 @@ class Surface2D(object):
 
         self._edge_set = zip(self.geometry, self.geometry[1:] + [self.geometry[0]])
 
+        xs, ys = zip(*self.geometry)
+        self._bounding_box = (min(xs), min(ys), max(xs), max(ys))
+
+    def get_bounding_box(self):
+        return self._bounding_box
+
+    def at_pose(self, pose):
+        """Return a new surface with the same shape as this one at pose."""
+        return Surface2D(pose, self._original_geometry)
+
+    def swept_by(self, start, end):
+        """
+        Return a convex surface covering this shape as it moves from pose
+        start to pose end, with intermediate poses added for the rotation.
+        """
+        turns = int(ceil(abs(end.theta - start.theta) / (pi / 8)))
+        poses = [interpolate_poses(start, end, float(i) / (turns + 1)) for i in xrange(turns + 2)]
+        points = [p for pose in poses for p in pose.transform(self._original_geometry)]
+
+        return Surface2D(Pose2D(), convex_hull(points))
+
+    def get_local_extent(self):
+        """
+        Return the smallest side of the bounding box of the untransformed
+        shape, and the largest distance of its points from the origin.
+        """
+        xs, ys = zip(*self._original_geometry)
+        width = min(max(xs) - min(xs), max(ys) - min(ys))
+        radius = max(sqrt(x ** 2 + y ** 2) for x, y in self._original_geometry)
+        return width, radius
+
     def precheck_surface(self, surface):
-#        d = norm(self._centroid_-surface_b.centroid_);
-        d = sqrt((self._centroid[0] - surface._centroid[0]) ** 2 + (self._centroid[1] - surface._centroid[1]) ** 2)
-        return d < (self._geometric_span + surface._geometric_span) / sqrt(3)
+        return bounding_boxes_overlap(self._bounding_box, surface._bounding_box)
+
+    def overlaps(self, other):
+        """
+        Return whether the two surfaces touch or overlap, including when one
+        lies entirely inside the other.
+
+        Convex pairs use the separating axis test; otherwise the edges are
+        tested for a crossing, stopping at the first one found.
+        """
+        if not self.precheck_surface(other):
+            return False
+
+        if self._is_convex and other._is_convex:
+            return not (self._has_separating_axis(other) or other._has_separating_axis(self))
+
+        for edge_a in self._edge_set:
+            for edge_b in other._edge_set:
+                if segments_intersect(edge_a, edge_b):
+                    return True
+
+        return self.contains_point(other.geometry[0]) or other.contains_point(self.geometry[0])
+
+    def distance_to(self, other):
+        """Return the distance between the two surfaces, 0 if they overlap."""
+        if self.overlaps(other):
+            return 0.0
+
+        return min(
+            min(point_segment_distance(p, edge) for p in self.geometry for edge in other._edge_set),
+            min(point_segment_distance(p, edge) for p in other.geometry for edge in self._edge_set))
+
+    def contains_point(self, point):
+        x, y = point
+        inside = False
+
+        for (x_1, y_1), (x_2, y_2) in self._edge_set:
+            if (y_1 > y) != (y_2 > y) and x < x_1 + (y - y_1) * (x_2 - x_1) / (y_2 - y_1):
+                inside = not inside
+
+        return inside
+
+    def _has_separating_axis(self, other):
+        # project both surfaces onto the normal of each edge of this one
+        for (x_1, y_1), (x_2, y_2) in self._edge_set:
+            n_x = y_1 - y_2
+            n_y = x_2 - x_1
+
+            a = [n_x * p[0] + n_y * p[1] for p in self.geometry]
+            b = [n_x * p[0] + n_y * p[1] for p in other.geometry]
+
+            if max(a) < min(b) or max(b) < min(a):
+                return True
+
+        return False
 
     def intersection_with_surface(self, other):
         points = []
@@ -65,3 +239,35 @@ class Surface2D(object):
                     points.append((edge_a[0][0] + x_21 * u_a, edge_a[0][1] + y_21 * u_a))
 
         return points
+
+    def ray_intersection(self, origin, direction, max_distance):
+        """
+        Return the distance along the ray from origin in the (unit) direction
+        to the closest edge of the surface, or None if no edge is hit within
+        max_distance.
+        """
+        d_min = None
+        o_x, o_y = origin
+        d_x, d_y = direction
+
+        for edge in self._edge_set:
+            e_x = edge[1][0] - edge[0][0]
+            e_y = edge[1][1] - edge[0][1]
+
+            denominator = d_x * e_y - d_y * e_x
+            if denominator == 0:
+                continue
+
+            w_x = edge[0][0] - o_x
+            w_y = edge[0][1] - o_y
+
+            t = (w_x * e_y - w_y * e_x) / denominator
+            if t < 0 or t > max_distance:
+                continue
+
+            u = (w_x * d_y - w_y * d_x) / denominator
+            if u >= 0 and u <= 1:
+                max_distance = t
+                d_min = t
+
+        return d_min
@@ -0,0 +1,209 @@
+
+import argparse
+import json
+import sys
+import time
+from functools import partial
+from datetime import timedelta
+from simulator import World, Simulator, Physics
+from profiling import StepProfiler
+from robots.dynamics import DifferentialDrive
+import worldfile
+
+
+def _vectorized_physics():
+    from vectorized import VectorizedPhysics
+    return VectorizedPhysics
+
+physics_backends = {
+    'python': lambda: Physics,
+    'numpy': _vectorized_physics
+}
+
+
+def create_simulator(filename, time_step=timedelta(milliseconds=10), physics=Physics, fleet=False, integrator=None, rates=None, dynamics_substeps=1, swept_collisions=False, cache_dir=None, batch_controllers=False):
+    world = World()
+    world.build_from_file(filename, cache_dir)
+    return Simulator(world, time_step, physics, fleet, integrator, rates, dynamics_substeps, swept_collisions, batch_controllers)
+
+
+def run(simulator, steps=None, duration=None, stop_on_crash=True):
+    """
+    Step the simulator in a tight loop, without any rendering.
+
+    The run ends after the given number of steps or once the given amount
+    of simulated time (a timedelta) has elapsed, whichever comes first.
+    Like the UI, the run also ends when a robot crashes unless stop_on_crash
+    is False.
+
+    Returns a report of the run as a dictionary.
+    """
+
+    if steps is None and duration is None:
+        raise ValueError('either steps or duration must be given')
+
+    end_time = simulator.time + duration if duration is not None else None
+    count = 0
+
+    start = time.time()
+    while steps is None or count < steps:
+        if end_time is not None and simulator.time >= end_time:
+            break
+
+        simulator.step()
+        count += 1
+
+        if stop_on_crash and simulator.has_crashed:
+            break
+    elapsed = time.time() - start
+
+    return {
+        'steps': count,
+        'simulated_time': simulator.time.total_seconds(),
+        'wall_time': elapsed,
+        'steps_per_second': count / elapsed if elapsed > 0 else float('inf'),
+        'crashed': simulator.has_crashed,
+        'collision_time': simulator.collision_time.total_seconds() if simulator.collision_time is not None else None,
+        'robots': [
+            {
+                'x': robot.get_pose().x,
+                'y': robot.get_pose().y,
+                'theta': robot.get_pose().theta
+            }
+            for robot in simulator._world.robots]
+    }
+
+
+def format_report(report):
+    lines = [
+        'steps:           {}'.format(report['steps']),
+        'simulated time:  {:.3f} s'.format(report['simulated_time']),
+        'wall time:       {:.3f} s'.format(report['wall_time']),
+        'steps/second:    {:.1f}'.format(report['steps_per_second']),
+        'crashed:         {}'.format('yes' if report['crashed'] else 'no')
+    ]
+
+    if report['collision_time'] is not None:
+        lines.append('collision time:  {:.3f} s'.format(report['collision_time']))
+
+    for i, pose in enumerate(report['robots']):
+        lines.append('robot {}:         x={:.4f} y={:.4f} theta={:.4f}'.format(i, pose['x'], pose['y'], pose['theta']))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a Sim.I.am simulation without the UI.')
+    parser.add_argument('settings', nargs='?', default='settings.xml', help='world description (default: settings.xml)')
+    parser.add_argument('--world-cache', nargs='?', const=worldfile.default_cache_dir, metavar='DIR', help='compile the world file into DIR (default: {}) and load it from there next time'.format(worldfile.default_cache_dir))
+    parser.add_argument('-n', '--steps', type=int, help='number of steps to run')
+    parser.add_argument('-d', '--duration', type=float, help='amount of simulated time to run, in seconds')
+    parser.add_argument('-t', '--time-step', type=float, default=10, help='simulation time step, in milliseconds (default: 10)')
+    parser.add_argument('-p', '--physics', choices=sorted(physics_backends), default='python', help='physics backend (default: python)')
+    parser.add_argument('--sensor-model', choices=['cone', 'rays'], help='proximity sensor model for every robot (default: as in the settings)')
+    parser.add_argument('--sensor-rays', type=int, default=3, help='rays per sensor for the rays sensor model (default: 3)')
+    parser.add_argument('-i', '--integrator', choices=DifferentialDrive.integrators, help='integrator for the robot dynamics (default: euler); arc is exact and allows larger time steps')
+    parser.add_argument('-r', '--rate', action='append', default=[], metavar='COMPONENT=HZ', help='update rate of controllers, sensors or collisions (default: every step)')
+    parser.add_argument('--substeps', type=int, default=1, help='dynamics substeps per time step, which must divide it into whole microseconds (default: 1)')
+    parser.add_argument('--distance-field', type=float, metavar='RESOLUTION', help='precompute a distance field of the obstacles with this cell size, in meters, to skip exact tests far from them')
+    parser.add_argument('--eager-sensors', action='store_true', help='compute every proximity sensor range in every step, not just the ones read')
+    parser.add_argument('--swept', action='store_true', help='check collisions along the motion of each step, not just at its end')
+    parser.add_argument('-w', '--workers', type=int, help='split the world into this many regions stepped by parallel processes (see simiam.parallel)')
+    parser.add_argument('--fleet', action='store_true', help='keep the robot state in arrays and step the dynamics of all robots at once')
+    parser.add_argument('--batch-controllers', action='store_true', help='evaluate the controllers of all robots at once with array operations')
+    parser.add_argument('--profile', action='store_true', help='report the time spent in each phase of the simulation step')
+    parser.add_argument('--profile-csv', help='write the profiling data to this CSV file every --profile-interval steps')
+    parser.add_argument('--profile-interval', type=int, default=100, help='steps per row of --profile-csv (default: 100)')
+    parser.add_argument('--record', metavar='FILE', help='record the state of the robots to this binary file (see simiam.recorder); this computes every sensor range that lazy sensing would skip, unless --record-no-sensors')
+    parser.add_argument('--record-no-sensors', action='store_true', help='leave the proximity sensor readings out of the recording')
+    parser.add_argument('--record-every', type=int, default=1, metavar='N', help='record only every Nth step (default: 1)')
+    parser.add_argument('--keep-going', action='store_true', help='keep running after a robot crashes')
+    parser.add_argument('-o', '--output', help='also write the report to this file as JSON')
+    args = parser.parse_args(argv)
+
+    if args.steps is None and args.duration is None:
+        parser.error('one of --steps or --duration is required')
+
+    rates = {}
+    for rate in args.rate:
+        component, _, hz = rate.partition('=')
+        if component not in Simulator.components or not hz:
+            parser.error('invalid --rate: {}'.format(rate))
+        rates[component] = float(hz)
+
+    time_step = timedelta(milliseconds=args.time_step)
+    if args.substeps < 1 or (time_step / args.substeps) * args.substeps != time_step:
+        parser.error('--substeps must split the time step into equal whole microseconds')
+
+    if args.workers is not None and (args.physics != 'python' or args.fleet or args.batch_controllers or args.swept or args.distance_field is not None or
+                                     args.eager_sensors or args.sensor_model is not None or args.profile or args.profile_csv or args.record):
+        parser.error('--workers does not support the physics, sensor, fleet, batching, profiling or recording options')
+
+    physics = physics_backends[args.physics]()
+    if args.distance_field is not None:
+        physics = partial(physics, field_resolution=args.distance_field)
+    if args.eager_sensors:
+        physics = partial(physics, lazy_sensors=False)
+
+    if args.workers is not None:
+        from parallel import ParallelSimulator
+        simulator = ParallelSimulator(args.settings, time_step, args.workers, args.integrator, rates, args.substeps, args.world_cache)
+    else:
+        simulator = create_simulator(
+            args.settings,
+            time_step,
+            physics,
+            args.fleet,
+            args.integrator,
+            rates,
+            args.substeps,
+            args.swept,
+            args.world_cache,
+            args.batch_controllers)
+
+    if args.sensor_model is not None:
+        for robot in simulator._world.robots:
+            robot.set_sensor_model(args.sensor_model, args.sensor_rays)
+
+    profile_output = None
+    if args.profile_csv is not None:
+        profile_output = open(args.profile_csv, 'wb')
+        simulator.enable_profiling(StepProfiler(args.profile_interval, profile_output))
+    elif args.profile:
+        simulator.enable_profiling()
+
+    recorder = None
+    if args.record is not None:
+        from recorder import Recorder
+        recorder = Recorder(simulator, decimation=args.record_every, output=args.record, sensors=not args.record_no_sensors)
+
+    report = run(
+        simulator,
+        steps=args.steps,
+        duration=timedelta(seconds=args.duration) if args.duration is not None else None,
+        stop_on_crash=not args.keep_going)
+
+    if recorder is not None:
+        recorder.close()
+
+    if args.workers is not None:
+        simulator.close()
+
+    if profile_output is not None:
+        profile_output.close()
+
+    print format_report(report)
+
+    if simulator.profiler is not None:
+        print
+        print simulator.profiler.format_stats()
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if report['crashed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import sys
+from importlib import import_module
+from types import ModuleType
+
+
+class _LazyPackage(ModuleType):
+    def __getattr__(self, name):
+        path = self._lazy_exports.get(name)
+        if path is None:
+            raise AttributeError(name)
+
+        module, _, attribute = path.partition(':')
+        value = import_module('{}.{}'.format(self.__name__, module))
+        if attribute:
+            value = getattr(value, attribute)
+
+        setattr(self, name, value)
+        return value
+
+
+def lazy_package(name, exports):
+    """
+    Replace the package module name in sys.modules by one that imports its
+    exports the first time they are asked for, rather than with the package.
+    exports maps each name to 'module:attribute', or to 'module' for a
+    submodule, relative to the package.
+    """
+    module = sys.modules[name]
+    package = _LazyPackage(name, module.__doc__)
+    package.__dict__.update(module.__dict__)
+    package._lazy_exports = exports
+
+    # keep the original module alive, as its globals are cleared when it is
+    # garbage collected
+    package._module = module
+    sys.modules[name] = package
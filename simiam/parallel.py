@@ -0,0 +1,389 @@
+import multiprocessing
+import numpy as np
+from bisect import bisect_right
+from datetime import timedelta
+from geometry import Pose2D
+from simulator import World, Simulator, Physics
+
+
+class _RegionPhysics(Physics):
+    """
+    Physics for the robots owned by one region. The world it is given holds
+    the owned robots and the ghosts of nearby ones, in their global order, so
+    that each pair of robots is tested for collision by exactly one region.
+    """
+
+    def __init__(self, world, owned, lazy_sensors):
+        Physics.__init__(self, world, lazy_sensors=lazy_sensors)
+        self.owned = owned
+
+    def _active_robots(self):
+        return self.owned
+
+
+class _Barrier(object):
+    """Blocks each of parties processes in wait until all of them are waiting."""
+
+    def __init__(self, parties):
+        self._parties = parties
+        self._waiting = multiprocessing.RawValue('i', 0)
+        self._generation = multiprocessing.RawValue('i', 0)
+        self._condition = multiprocessing.Condition()
+
+    def wait(self):
+        with self._condition:
+            generation = self._generation.value
+            self._waiting.value += 1
+
+            if self._waiting.value == self._parties:
+                self._waiting.value = 0
+                self._generation.value += 1
+                self._condition.notify_all()
+            else:
+                while self._generation.value == generation:
+                    self._condition.wait()
+
+
+class _Region(object):
+    """The robots of one strip of the world, stepped in a worker process."""
+
+    def __init__(self, filename, options, owned, boundaries, index, poses, barrier, collided):
+        self._world = World()
+        self._world.build_from_file(filename, options['cache_dir'])
+
+        self._time_step = options['time_step']
+        self._periods = options['periods']
+        self._substeps = options['dynamics_substeps']
+        self._margin = options['margin']
+        self._boundaries = boundaries
+        self._index = index
+        self._poses = poses
+        self._barrier = barrier
+        self._collided = collided
+        self._tick = 0
+
+        if options['integrator'] is not None:
+            for robot in self._world.robots:
+                robot.dynamics.set_integrator(options['integrator'])
+
+        self._owned = sorted(owned)
+        self._view = World()
+        self._view.obstacles = self._world.obstacles
+        self._physics = _RegionPhysics(self._view, [], options['lazy_sensors'])
+
+    def _is_due(self, component):
+        return self._tick % self._periods[component] == 0
+
+    def step(self, immigrants, collisions, sensors):
+        """
+        Adopt immigrants and run one step for the owned robots, with the
+        requested physics phases. Returns whether one of them collided and
+        the emigrants, as end_step.
+
+        The regions wait for each other, rather than for the simulator, once
+        all poses are shared and once all collisions are known, so that a
+        step takes a single message each way.
+        """
+        if immigrants:
+            self.adopt(immigrants)
+
+        self.advance()
+        self._barrier.wait()
+
+        collided = self.physics(collisions, sensors)
+        if collisions:
+            if collided:
+                self._collided.value = 1
+            self._barrier.wait()
+
+        if sensors and not self._collided.value:
+            self.sense()
+
+        return collided, self.end_step()
+
+    def advance(self):
+        # everything in a step up to the physics
+        world = self._world
+
+        if self._is_due('controllers'):
+            time_step = self._time_step * self._periods['controllers']
+            for i in self._owned:
+                world.controllers[i].execute(time_step)
+
+        substep = self._time_step / self._substeps
+        for _ in xrange(self._substeps):
+            for i in self._owned:
+                world.robots[i].execute(substep)
+
+        if 0 in self._owned:
+            world.application.run(self._time_step)
+
+        self._physics.robots_moved()
+
+        for i in self._owned:
+            pose = world.robots[i].get_pose()
+            self._poses[i] = (pose.x, pose.y, pose.theta)
+
+    def physics(self, collisions, sensors):
+        """
+        Run the requested physics phases for the owned robots. Returns
+        whether one of them collided; the sensors are then left alone.
+        """
+        collided = False
+
+        if collisions or sensors:
+            self._update_view()
+            self._physics._update_indices()
+
+            if collisions:
+                collided = self._physics._body_collision_detection()
+
+        return collided
+
+    def sense(self):
+        self._physics._update_proximity_sensors()
+
+    def end_step(self):
+        """
+        Finish the step, and return the state of the owned robots that left
+        the strip as (robot, region, state) tuples.
+        """
+        self._tick += 1
+        world = self._world
+        emigrants = []
+
+        for i in list(self._owned):
+            region = bisect_right(self._boundaries, world.robots[i].get_pose().x)
+            if region != self._index:
+                self._owned.remove(i)
+                emigrants.append((i, region, self._get_state(i)))
+
+        return emigrants
+
+    def adopt(self, immigrants):
+        world = self._world
+
+        for i, state in immigrants:
+            robot_state, controller_state, application_state = state
+            world.robots[i].set_state(robot_state)
+            world.controllers[i].set_state(controller_state)
+            if application_state is not None:
+                world.application.set_state(application_state)
+
+        self._owned = sorted(self._owned + [i for i, _ in immigrants])
+
+    def get_states(self):
+        return [(i, self._get_state(i)) for i in self._owned]
+
+    def _get_state(self, i):
+        world = self._world
+        return (
+            world.robots[i].get_state(),
+            world.controllers[i].get_state(),
+            world.application.get_state() if i == 0 else None)
+
+    def _update_view(self):
+        # The ghosts are the other robots within reach of an owned one;
+        # their poses are copied from the shared array.
+        robots = self._world.robots
+        owned = self._owned
+        self._physics.owned = [robots[i] for i in owned]
+
+        if not owned:
+            self._view.robots = []
+            return
+
+        xs = self._poses[:, 0]
+        low = xs[owned].min() - self._margin
+        high = xs[owned].max() + self._margin
+
+        near = np.nonzero((xs >= low) & (xs <= high))[0].tolist()
+        owned_set = set(owned)
+
+        for i in near:
+            if i not in owned_set:
+                robots[i].set_pose(Pose2D(*self._poses[i].tolist()))
+
+        self._view.robots = [robots[i] for i in near]
+
+
+def _worker(connection, filename, options, owned, boundaries, index, shared_poses, barrier, collided):
+    poses = np.frombuffer(shared_poses).reshape(-1, 3)
+    region = _Region(filename, options, owned, boundaries, index, poses, barrier, collided)
+    connection.send(None)
+
+    while True:
+        command, data = connection.recv()
+        if command == 'step':
+            connection.send(region.step(*data))
+        elif command == 'adopt':
+            region.adopt(data)
+        elif command == 'get_states':
+            connection.send(region.get_states())
+        else:
+            break
+
+    connection.close()
+
+
+class ParallelSimulator(object):
+    """
+    Simulator that splits the world into vertical strips, each stepped by
+    its own worker process, and gives the same results as Simulator.
+
+    Every worker loads the whole world but only runs the controllers,
+    dynamics and physics of the robots whose centres lie in its strip; the
+    application runs with the first robot. The poses of all robots are
+    shared through shared memory after the dynamics of each step, and each
+    worker copies the robots within sensor and collision reach of its own
+    ones as ghosts. Robots leaving a strip migrate, with their state, to
+    the worker of the strip they entered. Each step takes one message to
+    and from each worker; within it the workers synchronize directly, so
+    the speedup grows with the work per robot and the number of cores.
+
+    The steps are synchronized so that, as in Simulator, a collision
+    anywhere ends the physics for every robot. The proximity sensors are
+    evaluated lazily as by default, except that when they are updated less
+    often than every step they are evaluated eagerly, matching Simulator
+    with lazy_sensors off; lazy ranges would then depend on the poses of
+    robots in other workers at the time of reading. For the same reason,
+    ranges first read after a crash, when the robots move on without
+    physics, may differ. The swept collision, distance field and fleet
+    options are not supported.
+
+    The robot poses of the world of this simulator are kept up to date,
+    for reporting; call sync to also get the rest of the robot state.
+    """
+
+    components = Simulator.components
+
+    def __init__(self, filename, time_step, workers=None, integrator=None, rates=None, dynamics_substeps=1, cache_dir=None):
+        if dynamics_substeps < 1 or (time_step / dynamics_substeps) * dynamics_substeps != time_step:
+            raise ValueError('time step of {} cannot be split into {} equal substeps'.format(time_step, dynamics_substeps))
+
+        self._time_step = time_step
+        self.time = timedelta(0)
+        self.has_crashed = False
+        self.collision_time = None
+        self.profiler = None
+        self._tick = 0
+
+        # with cache_dir the workers map the compiled world written here
+        self._world = World()
+        self._world.build_from_file(filename, cache_dir)
+        robots = self._world.robots
+
+        self._periods = dict.fromkeys(self.components, 1)
+        for component, rate in (rates or {}).iteritems():
+            if component not in self._periods:
+                raise ValueError('unknown component: {}'.format(component))
+            self._periods[component] = max(1, int(round(1.0 / (rate * time_step.total_seconds()))))
+
+        # robots interact only when their centres are within the reach of
+        # a sensor plus the radius of a robot
+        margin = max([x.get_bounds().get_local_extent()[1] for r in robots for x in r.ir_sensors] + [0])
+        margin += max([r.get_bounds().get_local_extent()[1] for r in robots] + [0])
+
+        # split the robots evenly between strips, by their starting x
+        workers = max(1, min(workers or multiprocessing.cpu_count(), len(robots)))
+        order = sorted(range(len(robots)), key=lambda i: robots[i].get_pose().x)
+        groups = [order[len(order) * k // workers:len(order) * (k + 1) // workers] for k in xrange(workers)]
+        boundaries = [(robots[groups[k - 1][-1]].get_pose().x + robots[groups[k][0]].get_pose().x) / 2 for k in xrange(1, workers)]
+
+        self._shared_poses = multiprocessing.RawArray('d', 3 * len(robots))
+        self._poses = np.frombuffer(self._shared_poses).reshape(-1, 3)
+        self._collided = multiprocessing.RawValue('i', 0)
+        barrier = _Barrier(len(groups))
+
+        options = {
+            'time_step': time_step,
+            'periods': self._periods,
+            'dynamics_substeps': dynamics_substeps,
+            'integrator': integrator,
+            'margin': margin,
+            'cache_dir': cache_dir,
+            'lazy_sensors': self._periods['sensors'] == 1
+        }
+
+        self._connections = []
+        self._processes = []
+        for k, group in enumerate(groups):
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child, filename, options, group, boundaries, k, self._shared_poses, barrier, self._collided))
+            process.daemon = True
+            process.start()
+            child.close()
+
+            self._connections.append(connection)
+            self._processes.append(process)
+
+        for connection in self._connections:
+            connection.recv()
+
+        # the robots that left a strip in the last step, per region joined
+        self._immigrants = [[] for _ in self._connections]
+
+    def _is_due(self, component):
+        return self._tick % self._periods[component] == 0
+
+    def _broadcast(self, command, data=None, reply=True):
+        for connection in self._connections:
+            connection.send((command, data))
+
+        if reply:
+            return [x.recv() for x in self._connections]
+
+    def step(self):
+        collisions = not self.has_crashed and self._is_due('collisions')
+        sensors = not self.has_crashed and self._is_due('sensors')
+
+        for connection, arrivals in zip(self._connections, self._immigrants):
+            connection.send(('step', (arrivals, collisions, sensors)))
+
+        self._immigrants = [[] for _ in self._connections]
+        collided = False
+        for connection in self._connections:
+            region_collided, emigrants = connection.recv()
+            collided = collided or region_collided
+            for i, region, state in emigrants:
+                self._immigrants[region].append((i, state))
+
+        if collided:
+            print 'COLLISION!'
+            self.has_crashed = True
+            self.collision_time = self.time + self._time_step
+            self._collided.value = 0
+
+        self.time += self._time_step
+        self._tick += 1
+
+        for robot, pose in zip(self._world.robots, self._poses.tolist()):
+            robot.set_pose(Pose2D(*pose))
+
+    def _deliver_immigrants(self):
+        for connection, arrivals in zip(self._connections, self._immigrants):
+            if arrivals:
+                connection.send(('adopt', arrivals))
+
+        self._immigrants = [[] for _ in self._connections]
+
+    def sync(self):
+        """Copy the full state of every robot and controller from the workers."""
+        world = self._world
+        self._deliver_immigrants()
+
+        for states in self._broadcast('get_states'):
+            for i, (robot_state, controller_state, application_state) in states:
+                world.robots[i].set_state(robot_state)
+                world.controllers[i].set_state(controller_state)
+                if application_state is not None:
+                    world.application.set_state(application_state)
+
+    def close(self):
+        self._broadcast('close', reply=False)
+        for connection, process in zip(self._connections, self._processes):
+            connection.close()
+            process.join()
+
+        self._connections = []
+        self._processes = []
@@ -0,0 +1,116 @@
+
+import csv
+from time import time
+
+
+class StepProfiler(object):
+    """
+    Wall time per simulator phase and counters for the geometric tests run
+    by Physics. The overlap tests of collision detection count as the edge
+    pairs they may test, and as one intersection when the surfaces overlap.
+
+    Attach one with Simulator.enable_profiling. If dump_interval and output
+    are given, the totals for every dump_interval steps are written to output
+    (a file object) as a CSV row.
+    """
+
+    phases = ['controllers', 'robots', 'application', 'collisions', 'sensors']
+    counters = ['prechecks', 'prechecks_passed', 'edge_tests', 'intersections']
+
+    def __init__(self, dump_interval=None, output=None):
+        self._dump_interval = dump_interval
+        self._writer = csv.writer(output) if output is not None else None
+        self._header_written = False
+
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.times = dict.fromkeys(self.phases, 0.0)
+        self.counts = dict.fromkeys(self.counters, 0)
+
+        self._interval_steps = 0
+        self._interval_times = dict.fromkeys(self.phases, 0.0)
+        self._interval_counts = dict.fromkeys(self.counters, 0)
+
+    def clock(self):
+        return time()
+
+    def lap(self, phase, start):
+        """Add the time since start to phase and return the current time."""
+        now = time()
+        self._interval_times[phase] += now - start
+        return now
+
+    def count_precheck(self, passed):
+        self._interval_counts['prechecks'] += 1
+        if passed:
+            self._interval_counts['prechecks_passed'] += 1
+
+    def count_intersection(self, surface_a, surface_b, points):
+        self._interval_counts['edge_tests'] += len(surface_a._edge_set) * len(surface_b._edge_set)
+        self._interval_counts['intersections'] += len(points)
+
+    def count_overlap(self, surface_a, surface_b, overlapping):
+        self._interval_counts['edge_tests'] += len(surface_a._edge_set) * len(surface_b._edge_set)
+        self._interval_counts['intersections'] += int(overlapping)
+
+    def add_counts(self, **counts):
+        for name, value in counts.iteritems():
+            self._interval_counts[name] += value
+
+    def end_step(self, simulation_time):
+        self._interval_steps += 1
+
+        if self._dump_interval is not None and self._interval_steps >= self._dump_interval:
+            self._flush(simulation_time)
+
+    def get_stats(self):
+        """
+        Return the totals since the last reset, along with the mean time per
+        step of each phase.
+        """
+        steps = self.steps + self._interval_steps
+        times = dict((x, self.times[x] + self._interval_times[x]) for x in self.phases)
+        counts = dict((x, self.counts[x] + self._interval_counts[x]) for x in self.counters)
+
+        return {
+            'steps': steps,
+            'times': times,
+            'mean_times': dict((x, times[x] / steps if steps else 0.0) for x in self.phases),
+            'counts': counts
+        }
+
+    def format_stats(self):
+        stats = self.get_stats()
+        total = sum(stats['times'].values())
+
+        lines = []
+        for phase in self.phases:
+            share = stats['times'][phase] / total if total else 0.0
+            lines.append('{:12} {:10.3f} s {:6.1%} {:12.1f} us/step'.format(
+                phase, stats['times'][phase], share, stats['mean_times'][phase] * 1e6))
+        for counter in self.counters:
+            lines.append('{:16} {:12}'.format(counter, stats['counts'][counter]))
+
+        return '\n'.join(lines)
+
+    def _flush(self, simulation_time):
+        if self._writer is not None:
+            if not self._header_written:
+                self._writer.writerow(['time', 'steps'] + self.phases + self.counters)
+                self._header_written = True
+
+            self._writer.writerow(
+                [simulation_time.total_seconds(), self._interval_steps] +
+                [self._interval_times[x] for x in self.phases] +
+                [self._interval_counts[x] for x in self.counters])
+
+        self.steps += self._interval_steps
+        for phase in self.phases:
+            self.times[phase] += self._interval_times[phase]
+            self._interval_times[phase] = 0.0
+        for counter in self.counters:
+            self.counts[counter] += self._interval_counts[counter]
+            self._interval_counts[counter] = 0
+        self._interval_steps = 0
@@ -0,0 +1,159 @@
+import json
+import numpy as np
+
+
+_magic = 'SIMIAM-RECORDING 1\n'
+
+
+class Recorder(object):
+    """
+    Records the state of every robot after each step of a Simulator.
+
+    Each record holds the step number and time and, per robot, the true
+    pose, the supervisor's state estimate, the wheel speeds, the encoder
+    ticks, the proximity sensor readings and the id of the active
+    controller. Only every decimation-th step is recorded.
+
+    Reading the proximity sensors forces the ranges that lazy sensing
+    deferred (see Physics) to be computed in every recorded step, which can
+    cost as much as eager sensing. With sensors False they are left alone
+    and recorded as NaN.
+
+    The latest capacity records are kept in a NumPy ring buffer, see
+    get_history. If output (a file name or a binary file) is given, every
+    record is also appended to it as it leaves the buffer, so memory use
+    stays bounded however long the run is. load reads such a file back as
+    a memory-mapped record array.
+    """
+
+    def __init__(self, simulator, capacity=10000, decimation=1, output=None, sensors=True):
+        self._simulator = simulator
+        self._sensors = sensors
+        self._world = simulator._world
+        self._decimation = decimation
+        self._calls = 0
+
+        robots = self._world.robots
+        self.dtype = _record_dtype(len(robots), max(len(x.ir_sensors) for x in robots) if robots else 0)
+
+        self._buffer = np.zeros(capacity, self.dtype)
+        self._capacity = capacity
+        self._next = 0
+        self._count = 0
+        self._unwritten = 0
+
+        self._output = None
+        self._owns_output = False
+        if output is not None:
+            if isinstance(output, basestring):
+                output = open(output, 'wb')
+                self._owns_output = True
+            self._output = output
+            _write_header(output, self.dtype)
+
+        simulator.add_observer(self._on_step)
+
+    def __len__(self):
+        return self._count
+
+    def _on_step(self, simulator):
+        calls = self._calls
+        self._calls += 1
+        if calls % self._decimation:
+            return
+
+        # the oldest record is about to be overwritten, so it must be on disk
+        if self._output is not None and self._unwritten == self._capacity:
+            self._flush_records(self._capacity // 2 or 1)
+
+        buffer = self._buffer
+        n = self._next
+        buffer['step'][n] = simulator._tick
+        buffer['time'][n] = simulator.time.total_seconds()
+
+        for i, (robot, controller) in enumerate(zip(self._world.robots, self._world.controllers)):
+            pose = robot.get_pose()
+            estimate = controller.get_state_estimate()
+            buffer['pose'][n, i] = (pose.x, pose.y, pose.theta)
+            buffer['estimate'][n, i] = (estimate.x, estimate.y, estimate.theta)
+            buffer['wheel_speeds'][n, i] = robot.get_wheel_speeds()
+            buffer['ticks'][n, i] = [x.ticks for x in robot.encoders]
+            if self._sensors:
+                buffer['ir'][n, i, :len(robot.ir_sensors)] = [x.get_range() for x in robot.ir_sensors]
+            else:
+                buffer['ir'][n, i] = np.nan
+            buffer['controller'][n, i] = controller.get_current_controller_id()
+
+        self._next = (self._next + 1) % self._capacity
+        self._count = min(self._count + 1, self._capacity)
+        self._unwritten += 1
+
+    def get_history(self):
+        """Return the buffered records, oldest first, as a record array."""
+        start = (self._next - self._count) % self._capacity
+        if start + self._count <= self._capacity:
+            return self._buffer[start:start + self._count].copy()
+        return np.concatenate((self._buffer[start:], self._buffer[:self._next]))
+
+    def flush(self):
+        """Write every record not yet in the output file."""
+        if self._output is not None:
+            self._flush_records(self._unwritten)
+            self._output.flush()
+
+    def close(self):
+        """Stop recording, and write and close the output file."""
+        self._simulator.remove_observer(self._on_step)
+        self.flush()
+        if self._owns_output:
+            self._output.close()
+        self._output = None
+
+    def _flush_records(self, count):
+        start = (self._next - self._unwritten) % self._capacity
+        end = start + count
+
+        if end <= self._capacity:
+            self._buffer[start:end].tofile(self._output)
+        else:
+            self._buffer[start:].tofile(self._output)
+            self._buffer[:end - self._capacity].tofile(self._output)
+
+        self._unwritten -= count
+
+
+def _record_dtype(robots, sensors):
+    return np.dtype([
+        ('step', '<i8'),
+        ('time', '<f8'),
+        ('pose', '<f8', (robots, 3)),
+        ('estimate', '<f8', (robots, 3)),
+        ('wheel_speeds', '<f8', (robots, 2)),
+        ('ticks', '<f8', (robots, 2)),
+        ('ir', '<f8', (robots, sensors)),
+        ('controller', '<i4', (robots,))
+    ])
+
+
+def _write_header(output, dtype):
+    # the magic line, then the record layout as JSON, padded so that the
+    # records start at a multiple of 16 bytes
+    header = _magic + json.dumps({'robots': dtype['pose'].shape[0], 'sensors': dtype['ir'].shape[1]})
+    header += ' ' * (15 - len(header) % 16) + '\n'
+    output.write(header)
+
+
+def load(filename):
+    """Memory-map the records of a file written by a Recorder."""
+    with open(filename, 'rb') as f:
+        if f.readline() != _magic:
+            raise ValueError('not a recording: {}'.format(filename))
+        layout = json.loads(f.readline())
+        offset = f.tell()
+        f.seek(0, 2)
+        size = f.tell() - offset
+
+    dtype = _record_dtype(layout['robots'], layout['sensors'])
+    if size < dtype.itemsize:
+        return np.zeros(0, dtype)
+    return np.memmap(filename, dtype, 'r', offset, (size // dtype.itemsize,))
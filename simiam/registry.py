@@ -0,0 +1,42 @@
+from importlib import import_module
+
+
+# the built-in types by kind, as paths relative to the package; their modules
+# are only imported when a type is first looked up
+_types = {
+    'applications': {
+        'DemoApp': 'applications.demo.DemoApp'
+    },
+    'robots': {
+        'Khepera3': 'robots.khepera3.Khepera3'
+    },
+    'controllers': {
+        'khepera3.K3Supervisor': 'controllers.khepera3.K3Supervisor'
+    }
+}
+
+
+def register(kind, name, path):
+    """
+    Make name, as used in settings files, refer to the class at path, a
+    dotted path relative to the simiam package such as
+    'robots.khepera3.Khepera3'.
+    """
+    _types.setdefault(kind, {})[name] = path
+
+
+def lookup(kind, name):
+    """
+    Return the class registered as name for kind ('applications', 'robots'
+    or 'controllers'), importing its module if needed. Names that are not
+    registered are taken as a module and class path within the kind's
+    package, e.g. 'khepera3.K3Supervisor' for controllers.
+    """
+    path = _types.get(kind, {}).get(name)
+    if path is None:
+        if '.' not in name:
+            raise ValueError('unknown {} type: {}'.format(kind, name))
+        path = '{}.{}'.format(kind, name)
+
+    module, _, attribute = path.rpartition('.')
+    return getattr(import_module('{}.{}'.format(__name__.rpartition('.')[0], module)), attribute)
@@ -1,2 +1,3 @@
+from ..lazy import lazy_package
 
-from khepera3 import Khepera3
+lazy_package(__name__, {'Khepera3': 'khepera3:Khepera3'})
@@ -3,9 +3,36 @@ from math import cos, sin
 from ..geometry import Pose2D
 
 class DifferentialDrive(object):
-    def __init__(self, wheel_radius, wheel_base_length):
+    """
+    Unicycle kinematics of a two-wheeled differential drive robot.
+
+    The wheel speeds are held constant over each step, and the pose is
+    integrated with one of:
+
+      'euler'     one forward Euler step (the default, as in the original)
+      'arc'       the exact solution, a circular arc for constant (v, w)
+      'rk4'       one classic fourth order Runge-Kutta step
+      'adaptive'  RK4 with step doubling, subdividing the step until the
+                  position error estimate is below tolerance (in meters)
+
+    'arc' is exact for any time step, so it allows much coarser steps than
+    'euler' without any loss of accuracy.
+    """
+
+    integrators = ['euler', 'arc', 'rk4', 'adaptive']
+
+    def __init__(self, wheel_radius, wheel_base_length, integrator='euler', tolerance=1e-6):
         self._wheel_radius = wheel_radius
         self._wheel_base_length = wheel_base_length
+        self.set_integrator(integrator, tolerance)
+
+    def set_integrator(self, integrator, tolerance=1e-6):
+        if integrator not in self.integrators:
+            raise ValueError('unknown integrator: {}'.format(integrator))
+
+        self.integrator = integrator
+        self.tolerance = tolerance
+        self._integrate = getattr(self, '_integrate_' + integrator)
     
     def apply_dynamics(self, pose_t, time_delta, vel_r, vel_l):
         R = self._wheel_radius
@@ -19,11 +46,61 @@ class DifferentialDrive(object):
         # pose_t_1 = simiam.ui.Pose2D(z(end,1),z(end,2),z(end,3));
 
         dt = time_delta.total_seconds()
-        x_k_1 = pose_t.x + dt * (v * cos(pose_t.theta))
-        y_k_1 = pose_t.y + dt * (v * sin(pose_t.theta))
-        theta_k_1 = pose_t.theta + dt * w
+        return Pose2D(*self._integrate(pose_t.x, pose_t.y, pose_t.theta, v, w, dt))
+
+    def _integrate_euler(self, x, y, theta, v, w, dt):
+        x_k_1 = x + dt * (v * cos(theta))
+        y_k_1 = y + dt * (v * sin(theta))
+        theta_k_1 = theta + dt * w
         
-        return Pose2D(x_k_1, y_k_1, theta_k_1)
+        return (x_k_1, y_k_1, theta_k_1)
+
+    def _integrate_arc(self, x, y, theta, v, w, dt):
+        theta_k_1 = theta + dt * w
+
+        # straight line; also avoids dividing by a tiny w
+        if abs(w * dt) < 1e-9:
+            return (x + dt * (v * cos(theta)), y + dt * (v * sin(theta)), theta_k_1)
+
+        r = v / w
+        return (
+            x + r * (sin(theta_k_1) - sin(theta)),
+            y - r * (cos(theta_k_1) - cos(theta)),
+            theta_k_1)
+
+    def _integrate_rk4(self, x, y, theta, v, w, dt):
+        # theta is linear in time, so the stages only differ in the heading
+        theta_2 = theta + dt / 2 * w
+        theta_4 = theta + dt * w
+
+        c = (cos(theta) + 4 * cos(theta_2) + cos(theta_4)) / 6
+        s = (sin(theta) + 4 * sin(theta_2) + sin(theta_4)) / 6
+
+        return (x + dt * v * c, y + dt * v * s, theta_4)
+
+    def _integrate_adaptive(self, x, y, theta, v, w, dt):
+        remaining = dt
+        h = dt
+
+        while remaining > 0:
+            h = min(h, remaining)
+
+            full = self._integrate_rk4(x, y, theta, v, w, h)
+            half = self._integrate_rk4(x, y, theta, v, w, h / 2)
+            half = self._integrate_rk4(half[0], half[1], half[2], v, w, h / 2)
+
+            error = max(abs(full[0] - half[0]), abs(full[1] - half[1])) / 15
+            if error > self.tolerance and h > dt * 1e-6:
+                h /= 2
+                continue
+
+            x, y, theta = half
+            remaining -= h
+
+            if error < self.tolerance / 32:
+                h *= 2
+
+        return (x, y, theta)
     
     # function dz = dynamics(obj, t, z)
     #     dz = zeros(5,1);
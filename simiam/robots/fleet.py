@@ -0,0 +1,91 @@
+
+import numpy as np
+from dynamics import DifferentialDrive
+
+
+class Fleet(object):
+    """
+    Struct-of-arrays state for a group of differential drive robots.
+
+    The poses (x, y, theta), wheel speeds (right, left) and encoder ticks
+    (right, left) of all robots live in contiguous arrays, one row per robot,
+    and execute integrates the dynamics and encoders of the whole fleet at
+    once. The robots join the fleet on construction and keep their per-robot
+    API as views onto their rows.
+    """
+
+    def __init__(self, robots):
+        n = len(robots)
+
+        self.poses = np.zeros((n, 3))
+        self.wheel_speeds = np.zeros((n, 2))
+        self.ticks = np.zeros((n, 2))
+
+        # bumped by execute, robots refresh their Pose2D when it changes
+        self.version = 0
+
+        integrators = set(x.dynamics.integrator for x in robots)
+        if len(integrators) > 1:
+            raise ValueError('all robots in a fleet must use the same integrator')
+        self.set_integrator(integrators.pop() if integrators else 'euler')
+
+        self._robots = list(robots)
+        self._wheel_radius = np.array([x.wheel_radius for x in robots], dtype=float)
+        self._wheel_base_length = np.array([x.wheel_base_length for x in robots], dtype=float)
+        self._speed_factor = np.array([x._speed_factor for x in robots], dtype=float)
+        self._ticks_per_rev = np.array([[y.ticks_per_rev for y in x.encoders] for x in robots], dtype=float).reshape(n, 2)
+
+        for i, robot in enumerate(robots):
+            robot.join_fleet(self, i)
+
+    def __len__(self):
+        return len(self._robots)
+
+    def set_integrator(self, integrator):
+        """
+        Select one of DifferentialDrive.integrators. Since the wheel speeds
+        are constant over a step, 'adaptive' uses the exact 'arc' solution
+        that it converges to.
+        """
+        if integrator not in DifferentialDrive.integrators:
+            raise ValueError('unknown integrator: {}'.format(integrator))
+        self.integrator = integrator
+
+    def execute(self, time_delta):
+        """Vectorized equivalent of Khepera3.execute for every robot."""
+        sf = self._speed_factor
+        R = self._wheel_radius
+        L = self._wheel_base_length
+
+        vel = self.wheel_speeds * (sf / R)[:, None]
+        vel_r = vel[:, 0]
+        vel_l = vel[:, 1]
+
+        # DifferentialDrive.apply_dynamics
+        v = R / 2 * (vel_r + vel_l)
+        w = R / L * (vel_r - vel_l)
+
+        dt = time_delta.total_seconds()
+        theta = self.poses[:, 2].copy()
+        theta_k_1 = theta + dt * w
+
+        if self.integrator == 'euler':
+            self.poses[:, 0] += dt * (v * np.cos(theta))
+            self.poses[:, 1] += dt * (v * np.sin(theta))
+        elif self.integrator == 'rk4':
+            theta_2 = theta + dt / 2 * w
+            self.poses[:, 0] += dt * v * (np.cos(theta) + 4 * np.cos(theta_2) + np.cos(theta_k_1)) / 6
+            self.poses[:, 1] += dt * v * (np.sin(theta) + 4 * np.sin(theta_2) + np.sin(theta_k_1)) / 6
+        else:
+            straight = np.abs(w * dt) < 1e-9
+            with np.errstate(divide='ignore', invalid='ignore'):
+                r = v / w
+                self.poses[:, 0] += np.where(straight, dt * (v * np.cos(theta)), r * (np.sin(theta_k_1) - np.sin(theta)))
+                self.poses[:, 1] += np.where(straight, dt * (v * np.sin(theta)), -r * (np.cos(theta_k_1) - np.cos(theta)))
+
+        self.poses[:, 2] = theta_k_1
+
+        # WheelEncoder.update_ticks
+        self.ticks += np.ceil(((vel * dt) * self._ticks_per_rev) / (2 * np.pi))
+
+        self.version += 1
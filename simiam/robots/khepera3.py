@@ -6,6 +6,31 @@ from dynamics import DifferentialDrive
 from ..geometry import Pose2D, Surface2D
 
 class Khepera3(Robot):
+    _top_plate_geometry = [
+        (-0.031,   0.043),
+        (-0.031,  -0.043),
+        ( 0.033,  -0.043),
+        ( 0.052,  -0.021),
+        ( 0.057,       0),
+        ( 0.052,   0.021),
+        ( 0.033,   0.043)
+    ]
+
+    _base_geometry = [
+        (-0.024,   0.064),
+        ( 0.033,   0.064),
+        ( 0.057,   0.043),
+        ( 0.074,   0.010),
+        ( 0.074,  -0.010),
+        ( 0.057,  -0.043),
+        ( 0.033,  -0.064),
+        (-0.025,  -0.064),
+        (-0.042,  -0.043),
+        (-0.048,  -0.010),
+        (-0.048,   0.010),
+        (-0.042,   0.043)
+    ]
+
     def __init__(self, initial_pose):
         # Add sensors: wheel encoders and IR proximity sensors
         self.wheel_radius = 0.021           # 42mm
@@ -13,6 +38,18 @@ class Khepera3(Robot):
         self._ticks_per_rev = 2765
         self._speed_factor = 6.2953e-6
         self._pose = initial_pose
+
+        # Bumped whenever the pose changes, so that the surfaces derived
+        # from it are only re-transformed when they are out of date.
+        self._pose_version = 0
+        self._bounds = Surface2D(initial_pose, self._top_plate_geometry)
+        self._base = Surface2D(initial_pose, self._base_geometry)
+        self._surfaces_version = 0
+
+        # set by join_fleet when the state is kept in a Fleet
+        self._fleet = None
+        self._fleet_index = None
+        self._fleet_version = None
         
         self.encoders = [
             WheelEncoder('right_wheel', self.wheel_radius, self.wheel_base_length, self._ticks_per_rev),
@@ -54,61 +91,70 @@ class Khepera3(Robot):
         self._right_wheel_speed = 0
         self._left_wheel_speed = 0
 
+    def join_fleet(self, fleet, index):
+        """
+        Move the pose, wheel speeds and encoder ticks of this robot into row
+        index of the arrays of fleet. The robot keeps working as before, as a
+        view onto that row.
+        """
+        pose = self.get_pose()
+        fleet.poses[index] = (pose.x, pose.y, pose.theta)
+        fleet.wheel_speeds[index] = self.get_wheel_speeds()
+
+        for i, encoder in enumerate(self.encoders):
+            encoder.join_fleet(fleet.ticks[:, i], index)
+
+        self._fleet = fleet
+        self._fleet_index = index
+        self._fleet_version = fleet.version
 
     def get_bounds(self):
-        return Surface2D(self._pose, [
-            (-0.031,   0.043),
-            (-0.031,  -0.043),
-            ( 0.033,  -0.043),
-            ( 0.052,  -0.021),
-            ( 0.057,       0),
-            ( 0.052,   0.021),
-            ( 0.033,   0.043)
-        ])
+        self._update_surfaces()
+        return self._bounds
 
     def get_pose(self):
+        fleet = self._fleet
+        if fleet is not None and self._fleet_version != fleet.version:
+            self._pose = Pose2D(*fleet.poses[self._fleet_index].tolist())
+            self._pose_version += 1
+            self._fleet_version = fleet.version
         return self._pose
 
+    def set_pose(self, pose):
+        self._pose = pose
+        self._pose_version += 1
+        if self._fleet is not None:
+            self._fleet.poses[self._fleet_index] = (pose.x, pose.y, pose.theta)
+
+    def get_pose_version(self):
+        self.get_pose()
+        return self._pose_version
+
     def get_surfaces(self):
         # Khepera3 in top-down 2D view
-        k3_top_plate = Surface2D(self._pose, [
-            (-0.031,   0.043),
-            (-0.031,  -0.043),
-            ( 0.033,  -0.043),
-            ( 0.052,  -0.021),
-            ( 0.057,       0),
-            ( 0.052,   0.021),
-            ( 0.033,   0.043)
-        ])
-                      
-        k3_base = Surface2D(self._pose, [
-            (-0.024,   0.064),
-            ( 0.033,   0.064),
-            ( 0.057,   0.043),
-            ( 0.074,   0.010),
-            ( 0.074,  -0.010),
-            ( 0.057,  -0.043),
-            ( 0.033,  -0.064),
-            (-0.025,  -0.064),
-            (-0.042,  -0.043),
-            (-0.048,  -0.010),
-            (-0.048,   0.010),
-            (-0.042,   0.043)
-        ])
-        
+        self._update_surfaces()
+
         return [
-            (k3_base, '#cccccc'),
-            (k3_top_plate, '#000000')
+            (self._base, '#cccccc'),
+            (self._bounds, '#000000')
         ] + [y for x in self.ir_sensors for y in x.get_surfaces()]
 
+    def _update_surfaces(self):
+        version = self.get_pose_version()
+        if self._surfaces_version != version:
+            self._bounds.set_pose(self._pose)
+            self._base.set_pose(self._pose)
+            self._surfaces_version = version
+
     def execute(self, time_delta):
         sf = self._speed_factor
         R = self.wheel_radius
         
-        vel_r = self._right_wheel_speed * (sf / R)     # mm/s
-        vel_l = self._left_wheel_speed * (sf / R)      # mm/s
+        right_wheel_speed, left_wheel_speed = self.get_wheel_speeds()
+        vel_r = right_wheel_speed * (sf / R)     # mm/s
+        vel_l = left_wheel_speed * (sf / R)      # mm/s
         
-        self._pose = self.dynamics.apply_dynamics(self._pose, time_delta, vel_r, vel_l)
+        self.set_pose(self.dynamics.apply_dynamics(self.get_pose(), time_delta, vel_r, vel_l))
 
         # self._update_pose(pose)
         
@@ -128,6 +174,39 @@ class Khepera3(Robot):
         self._right_wheel_speed = floor(vel_r * (R / sf))
         self._left_wheel_speed = floor(vel_l * (R / sf))
 
+        if self._fleet is not None:
+            self._fleet.wheel_speeds[self._fleet_index] = (self._right_wheel_speed, self._left_wheel_speed)
+
+    def get_state(self):
+        pose = self.get_pose()
+        return (
+            (pose.x, pose.y, pose.theta),
+            self.get_wheel_speeds(),
+            [x.ticks for x in self.encoders],
+            [x.get_state() for x in self.ir_sensors])
+
+    def set_state(self, state):
+        pose, wheel_speeds, ticks, sensors = state
+
+        self.set_pose(Pose2D(*pose))
+
+        self._right_wheel_speed, self._left_wheel_speed = wheel_speeds
+        if self._fleet is not None:
+            self._fleet.wheel_speeds[self._fleet_index] = wheel_speeds
+
+        for encoder, value in zip(self.encoders, ticks):
+            encoder.ticks = value
+
+        for ir_sensor, sensor_state in zip(self.ir_sensors, sensors):
+            ir_sensor.set_state(sensor_state)
+
+    def set_sensor_model(self, model, ray_count=3):
+        for ir_sensor in self.ir_sensors:
+            ir_sensor.set_model(model, ray_count)
+
+    def get_wheel_speeds(self):
+        return (self._right_wheel_speed, self._left_wheel_speed)
+
     def _limit_speeds(self, vel_r, vel_l):
         # actuator hardware limits
         v, w = self.dynamics.diff_to_uni(vel_r, vel_l)
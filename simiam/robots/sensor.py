@@ -1,5 +1,5 @@
 
-from math import tan, ceil, pi, sqrt
+from math import tan, ceil, pi, sqrt, sin, cos
 from ..geometry import Surface2D
 
 class WheelEncoder(object):
@@ -8,8 +8,27 @@ class WheelEncoder(object):
         self._radius = radius
         self._length = length
         self.ticks_per_rev = ticks_per_rev
+        self._fleet_ticks = None
+        self._fleet_index = None
         self.ticks = 0
 
+    @property
+    def ticks(self):
+        if self._fleet_ticks is not None:
+            return float(self._fleet_ticks[self._fleet_index])
+        return self._ticks
+
+    @ticks.setter
+    def ticks(self, value):
+        if self._fleet_ticks is not None:
+            self._fleet_ticks[self._fleet_index] = value
+        self._ticks = value
+
+    def join_fleet(self, ticks, index):
+        ticks[index] = self.ticks
+        self._fleet_ticks = ticks
+        self._fleet_index = index
+
     def update_ticks(self, wheel_velocity, time_delta):
         self.ticks += self._distance_to_ticks(wheel_velocity * time_delta.total_seconds())
 
@@ -24,7 +43,17 @@ class WheelEncoder(object):
 
 
 class ProximitySensor(object):
-    def __init__(self, sensor_type, parent, pose, r_min, r_max, phi, distance_to_raw=lambda x: x):
+    """
+    Range sensor with a cone-shaped field of view.
+
+    With the default 'cone' model physics intersects the cone polygon with
+    everything nearby. The 'rays' model instead casts ray_count rays spread
+    evenly across the cone, which is much cheaper and usually close enough.
+    """
+
+    models = ['cone', 'rays']
+
+    def __init__(self, sensor_type, parent, pose, r_min, r_max, phi, distance_to_raw=lambda x: x, model='cone', ray_count=3):
         self._type = sensor_type
         self._parent = parent
         self._location = pose
@@ -37,13 +66,62 @@ class ProximitySensor(object):
         
         self._distance_to_raw = distance_to_raw
 
-    def get_bounds(self):
-        parent_pose = self._parent.get_pose()
-
-        r = self._range
+        # computes the range when it is first needed, if physics deferred it
+        self._pending = None
+
+        # The cone only changes shape with the range, and physics always
+        # builds it at max_range, so that shape is computed once up front.
+        self._max_range_cone = self._create_cone(r_max)
+        self._bounds = Surface2D(parent.get_pose(), self._max_range_cone)
+        self._bounds_key = (parent.get_pose_version(), r_max)
+
+        self.set_model(model, ray_count)
+
+    def set_model(self, model, ray_count=3):
+        if model not in self.models:
+            raise ValueError('unknown proximity sensor model: {}'.format(model))
+        if ray_count < 1:
+            raise ValueError('ray_count must be at least 1')
+
+        self.model = model
+
+        # ray angles in the frame of the parent robot
+        if ray_count == 1:
+            offsets = [0.0]
+        else:
+            offsets = [-self._spread / 2 + i * self._spread / (ray_count - 1) for i in xrange(ray_count)]
+        self._ray_angles = [self._location.theta + x for x in offsets]
+        self._rays = None
+        self._rays_version = None
+
+    def get_rays(self):
+        """
+        Return the origin and unit direction vectors of the rays of the
+        sensor in world coordinates, along with the bounding box of the rays
+        at max_range.
+        """
+        version = self._parent.get_pose_version()
+
+        if version != self._rays_version:
+            parent_pose = self._parent.get_pose()
+            origin = parent_pose.transform([(self._location.x, self._location.y)])[0]
+            directions = [(cos(parent_pose.theta + x), sin(parent_pose.theta + x)) for x in self._ray_angles]
+
+            r = self.max_range
+            xs = [origin[0]] + [origin[0] + r * x[0] for x in directions]
+            ys = [origin[1]] + [origin[1] + r * x[1] for x in directions]
+
+            self._rays = (origin, directions, (min(xs), min(ys), max(xs), max(ys)))
+            self._rays_version = version
+
+        return self._rays
+
+    def _create_cone(self, r):
         r1 = r * tan(self._spread / 4)
         r2 = r * tan(self._spread / 2)
-        cone = Surface2D(self._location, [
+
+        # cone geometry in the frame of the parent robot
+        return self._location.transform([
             (0, 0),
             (sqrt(r ** 2 - r2 ** 2), r2),
             (sqrt(r ** 2 - r1 ** 2), r1),
@@ -52,7 +130,22 @@ class ProximitySensor(object):
             (sqrt(r ** 2 - r2 ** 2), -r2)
         ])
 
-        return Surface2D(self._parent.get_pose(), cone.geometry)
+    def get_bounds(self):
+        if self._pending is not None:
+            self._resolve()
+
+        key = (self._parent.get_pose_version(), self._range)
+
+        if key != self._bounds_key:
+            if self._range == self.max_range:
+                cone = self._max_range_cone
+            else:
+                cone = self._create_cone(self._range)
+
+            self._bounds.set_geometry(self._parent.get_pose(), cone)
+            self._bounds_key = key
+
+        return self._bounds
 
     def get_surfaces(self):
         # if (distance < self.max_range)
@@ -67,10 +160,31 @@ class ProximitySensor(object):
             (self.get_bounds(), '#ccccff')
         ]
 
+    def get_state(self):
+        if self._pending is not None:
+            self._resolve()
+        return self._range
+
+    def set_state(self, state):
+        self._pending = None
+        self._range = state
+
+    def defer(self, compute):
+        """Have compute() update the range the next time it is needed."""
+        self._pending = compute
+
+    def _resolve(self):
+        compute = self._pending
+        self._pending = None
+        compute()
+
     def update_range(self, distance):
+        self._pending = None
         self._range = self.limit_to_sensor(distance)
         
     def get_range(self):
+        if self._pending is not None:
+            self._resolve()
         return self._distance_to_raw(self._range)
 
     def limit_to_sensor(self, distance):
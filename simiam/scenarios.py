@@ -0,0 +1,248 @@
+import argparse
+import random
+import sys
+from math import pi, sqrt, sin, cos
+from geometry import Pose2D, Surface2D
+from spatial import UniformGrid
+from simulator import World
+from worldfile import Blueprint, write_xml
+
+
+layouts = ['random', 'grid', 'maze', 'corridor']
+
+
+def _rectangle(x_1, y_1, x_2, y_2):
+    return [(x_1, y_1), (x_2, y_1), (x_2, y_2), (x_1, y_2)]
+
+
+def _walls(half_size, thickness):
+    # the four walls around the arena, outside it
+    h = half_size
+    t = thickness
+    return [
+        _rectangle(-h - t, -h - t, h + t, -h),
+        _rectangle(-h - t, h, h + t, h + t),
+        _rectangle(-h - t, -h, -h, h),
+        _rectangle(h, -h, h + t, h)
+    ]
+
+
+def _random_field(rng, half_size, density, min_size, max_size):
+    # random squares rotated at random until their area covers density of
+    # the arena
+    target = density * (2 * half_size) ** 2
+    area = 0.0
+    obstacles = []
+
+    while area < target:
+        size = rng.uniform(min_size, max_size)
+        x = rng.uniform(-half_size + size, half_size - size)
+        y = rng.uniform(-half_size + size, half_size - size)
+        pose = Pose2D(x, y, rng.uniform(0, pi / 2))
+        obstacles.append(pose.transform(_rectangle(-size / 2, -size / 2, size / 2, size / 2)))
+        area += size ** 2
+
+    return obstacles
+
+
+def _grid_field(half_size, density, size):
+    # a lattice of squares whose area is density of the arena
+    pitch = size / sqrt(density)
+    count = int(2 * half_size / pitch)
+    offset = (count - 1) * pitch / 2
+
+    return [
+        _rectangle(i * pitch - offset - size / 2, j * pitch - offset - size / 2,
+                   i * pitch - offset + size / 2, j * pitch - offset + size / 2)
+        for i in xrange(count) for j in xrange(count)]
+
+
+def _maze(rng, half_size, cell_size, thickness):
+    # a perfect maze carved by a randomized depth-first search, with one
+    # wall segment per remaining wall between cells
+    cells = int(2 * half_size / cell_size)
+    origin = -cells * cell_size / 2
+
+    # walls east of (i, j) and north of (i, j), between neighbouring cells
+    east = set((i, j) for i in xrange(cells - 1) for j in xrange(cells))
+    north = set((i, j) for i in xrange(cells) for j in xrange(cells - 1))
+
+    visited = set([(0, 0)])
+    stack = [(0, 0)]
+    while stack:
+        i, j = stack[-1]
+        neighbours = [(a, b) for a, b in [(i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)]
+                      if 0 <= a < cells and 0 <= b < cells and (a, b) not in visited]
+        if not neighbours:
+            stack.pop()
+            continue
+
+        a, b = rng.choice(neighbours)
+        if a != i:
+            east.discard((min(a, i), j))
+        else:
+            north.discard((i, min(b, j)))
+
+        visited.add((a, b))
+        stack.append((a, b))
+
+    t = thickness / 2
+    obstacles = []
+    for i, j in sorted(east):
+        x = origin + (i + 1) * cell_size
+        obstacles.append(_rectangle(x - t, origin + j * cell_size - t, x + t, origin + (j + 1) * cell_size + t))
+    for i, j in sorted(north):
+        y = origin + (j + 1) * cell_size
+        obstacles.append(_rectangle(origin + i * cell_size - t, y - t, origin + (i + 1) * cell_size + t, y + t))
+
+    return obstacles, [(origin + (i + 0.5) * cell_size, origin + (j + 0.5) * cell_size) for i in xrange(cells) for j in xrange(cells)]
+
+
+def _corridors(rng, half_size, width, thickness, gap):
+    # horizontal walls splitting the arena into corridors of the given
+    # width, each with a doorway at a random position
+    obstacles = []
+    t = thickness / 2
+    y = -half_size + width
+
+    while y < half_size - width / 2:
+        door = rng.uniform(-half_size + gap, half_size - gap)
+        obstacles.append(_rectangle(-half_size, y - t, door - gap / 2, y + t))
+        obstacles.append(_rectangle(door + gap / 2, y - t, half_size, y + t))
+        y += width
+
+    return obstacles
+
+
+def _place(rng, count, half_size, clearance, obstacles, taken, candidates=None, attempts=1000):
+    # positions at least clearance from every obstacle and twice that from
+    # every position taken so far
+    index = UniformGrid(max(4 * clearance, 0.25))
+    for obstacle in obstacles:
+        index.insert(obstacle, obstacle.get_bounding_box())
+
+    footprint = [(clearance * cos(a * pi / 4), clearance * sin(a * pi / 4)) for a in xrange(8)]
+    positions = []
+
+    for _ in xrange(count):
+        for _ in xrange(attempts):
+            if candidates is not None:
+                x, y = rng.choice(candidates)
+            else:
+                x = rng.uniform(-half_size + clearance, half_size - clearance)
+                y = rng.uniform(-half_size + clearance, half_size - clearance)
+
+            if any((x - a) ** 2 + (y - b) ** 2 < (2 * clearance) ** 2 for a, b in taken):
+                continue
+
+            disk = Surface2D(Pose2D(x, y), footprint)
+            if any(disk.overlaps(o) for o in index.query(disk.get_bounding_box())):
+                continue
+
+            positions.append((x, y))
+            taken.append((x, y))
+            break
+        else:
+            raise ValueError('no room for {} robots with clearance {}'.format(count, clearance))
+
+    return positions
+
+
+def generate(layout='random', num_robots=1, seed=None, arena_size=10.0, density=0.1,
+             obstacle_size=(0.1, 0.4), cell_size=0.6, corridor_width=0.6, wall_thickness=0.05,
+             clearance=0.15, goals=True, robot_type='Khepera3', supervisor='khepera3.K3Supervisor',
+             app='DemoApp'):
+    """
+    Generate a world as a worldfile.Blueprint, the same for the same seed.
+
+    The arena is a square of side arena_size centred on the origin and
+    enclosed by walls. Its inside is filled according to layout:
+
+    'random'   randomly placed and rotated squares with sides in
+               obstacle_size, covering density of the arena
+    'grid'     a lattice of squares of the largest obstacle_size, covering
+               density of the arena
+    'maze'     the walls of a perfect maze with cells of cell_size
+    'corridor' parallel walls corridor_width apart, each with a doorway
+
+    num_robots robots start at random headings in places at least
+    clearance from any obstacle and twice that from each other. With goals,
+    each also gets a goal placed the same way.
+    """
+    if layout not in layouts:
+        raise ValueError('unknown layout: {}'.format(layout))
+    if layout in ['random', 'grid'] and density <= 0:
+        raise ValueError('density must be positive')
+
+    rng = random.Random(seed)
+    half_size = arena_size / 2
+    candidates = None
+
+    if layout == 'random':
+        geometries = _random_field(rng, half_size, density, *obstacle_size)
+    elif layout == 'grid':
+        geometries = _grid_field(half_size, density, obstacle_size[1])
+    elif layout == 'maze':
+        geometries, candidates = _maze(rng, half_size, cell_size, wall_thickness)
+    else:
+        geometries = _corridors(rng, half_size, corridor_width, wall_thickness, max(corridor_width, 4 * clearance))
+
+    geometries += _walls(half_size, wall_thickness)
+    obstacles = [Surface2D(Pose2D(), x) for x in geometries]
+
+    taken = []
+    starts = _place(rng, num_robots, half_size, clearance, obstacles, taken, candidates)
+    targets = _place(rng, num_robots, half_size, clearance, obstacles, taken, candidates) if goals else []
+
+    robots = []
+    for i, (x, y) in enumerate(starts):
+        row = {
+            'type': robot_type,
+            'supervisor': supervisor,
+            'pose': (x, y, rng.uniform(-pi, pi))
+        }
+        if goals:
+            row['goal'] = targets[i]
+        robots.append(row)
+
+    poses = [(0.0, 0.0, 0.0)] * len(geometries)
+    offsets = [0]
+    vertices = []
+    for geometry in geometries:
+        vertices.extend(geometry)
+        offsets.append(len(vertices))
+
+    return Blueprint(app, robots, poses, offsets, vertices)
+
+
+def generate_world(*args, **kwargs):
+    """Generate a World directly; takes the arguments of generate."""
+    world = World()
+    world.build_from_blueprint(generate(*args, **kwargs))
+    return world
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a Sim.I.am world file.')
+    parser.add_argument('layout', choices=layouts, help='obstacle layout')
+    parser.add_argument('-n', '--robots', type=int, default=1, help='number of robots (default: 1)')
+    parser.add_argument('-s', '--seed', type=int, help='random seed')
+    parser.add_argument('-a', '--arena-size', type=float, default=10.0, help='side of the square arena, in meters (default: 10)')
+    parser.add_argument('--density', type=float, default=0.1, help='fraction of the arena covered by random and grid obstacles (default: 0.1)')
+    parser.add_argument('--cell-size', type=float, default=0.6, help='maze cell size, in meters (default: 0.6)')
+    parser.add_argument('--corridor-width', type=float, default=0.6, help='corridor width, in meters (default: 0.6)')
+    parser.add_argument('--no-goals', action='store_true', help='do not give the robots goals')
+    parser.add_argument('-o', '--output', help='file to write the world to (default: standard output)')
+    args = parser.parse_args(argv)
+
+    if args.density <= 0:
+        parser.error('--density must be positive')
+
+    try:
+        blueprint = generate(args.layout, args.robots, args.seed, args.arena_size, args.density,
+                             cell_size=args.cell_size, corridor_width=args.corridor_width, goals=not args.no_goals)
+    except ValueError as e:
+        parser.error(str(e))
+
+    write_xml(blueprint, args.output if args.output is not None else sys.stdout)
+    return 0
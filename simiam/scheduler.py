@@ -0,0 +1,91 @@
+
+import threading
+import time
+
+
+class SimulationThread(threading.Thread):
+    """
+    Steps a Simulator on a worker thread, independently of any UI.
+
+    The simulation runs at real_time_factor times real time (None runs it
+    as fast as possible). Readers should hold lock while they look at the
+    simulator state, and anyone changing that state must hold it as well.
+    The thread pauses itself when a robot crashes.
+    """
+
+    # longest time slept in one go, so that pause and speed changes are
+    # picked up promptly
+    _max_sleep = 0.05
+
+    def __init__(self, simulator, real_time_factor=1.0):
+        threading.Thread.__init__(self, name='simulation')
+        self.daemon = True
+
+        self.lock = threading.RLock()
+        self._simulator = simulator
+        self._real_time_factor = real_time_factor
+        self._playing = threading.Event()
+        self._stopped = False
+        self._reset_clock()
+
+    def is_playing(self):
+        return self._playing.is_set()
+
+    def play(self):
+        with self.lock:
+            self._reset_clock()
+            self._playing.set()
+
+    def pause(self):
+        self._playing.clear()
+
+    def stop(self):
+        self._stopped = True
+        self._playing.set()
+
+    def get_real_time_factor(self):
+        return self._real_time_factor
+
+    def set_real_time_factor(self, real_time_factor):
+        with self.lock:
+            self._real_time_factor = real_time_factor
+            self._reset_clock()
+
+    def run(self):
+        simulator = self._simulator
+
+        while not self._stopped:
+            self._playing.wait()
+            if self._stopped:
+                break
+
+            with self.lock:
+                if not self._playing.is_set():
+                    continue
+
+                factor = self._real_time_factor
+                if factor is not None:
+                    # the simulation may have been rewound in the meantime
+                    if simulator.time < self._start_time:
+                        self._reset_clock()
+
+                    ahead = (simulator.time - self._start_time).total_seconds() / factor - (time.time() - self._start_clock)
+                    if ahead > 0:
+                        sleep = min(ahead, self._max_sleep)
+                    else:
+                        sleep = 0
+                        simulator.step()
+                else:
+                    sleep = 0
+                    simulator.step()
+
+                if simulator.has_crashed:
+                    self._playing.clear()
+
+            # also lets the UI thread get hold of the lock between steps
+            time.sleep(sleep)
+
+    def _reset_clock(self):
+        # pace against the point where playing started or the speed changed
+        self._start_clock = time.time()
+        self._start_time = self._simulator.time
@@ -1,11 +1,15 @@
 
-import xml.etree.ElementTree as ET
+import cPickle as pickle
+import zlib
+from functools import partial
+from collections import deque
 from datetime import timedelta
-from math import sqrt
-from geometry import Pose2D, Surface2D
-import applications
-import robots
-import controllers
+from math import sqrt, hypot, ceil
+from geometry import Pose2D, Surface2D, bounding_boxes_overlap, interpolate_poses
+from spatial import UniformGrid, suggest_cell_size
+from distancefield import DistanceField
+import registry
+import worldfile
 
 
 class Obstacle(Surface2D):
@@ -23,37 +27,36 @@ class World(object):
         self.controllers = []
         self.obstacles = []
 
-    def _lookup_class(self, module, name):
-        return reduce(getattr, name.split('.'), module)
+    def _lookup_class(self, kind, name):
+        return registry.lookup(kind, name)
 
-    def build_from_file(self, filename):
-        blueprint = ET.parse(filename).getroot()
+    def build_from_file(self, filename, cache_dir=None):
+        """
+        Add the contents of an XML or compiled world file. With cache_dir,
+        XML files are compiled into that directory on first load, see
+        worldfile.load.
+        """
+        self.build_from_blueprint(worldfile.load(filename, cache_dir))
 
-        app = blueprint.find('./app').get('type')
-        self.application = self._lookup_class(applications, app)()
+    def build_from_blueprint(self, blueprint):
+        """Add the contents of a worldfile.Blueprint."""
+        self.application = self._lookup_class('applications', blueprint.app)()
 
-        def get_float(node, name):
-            return float(node.get(name))
+        for row in blueprint.robots:
+            robot = self.add_robot(row['type'], row['supervisor'], Pose2D(*row['pose']))
 
-        def get_pose(node):
-            pose_node = node.find('./pose')
-            return Pose2D(*[get_float(pose_node, n) for n in ['x', 'y', 'theta']])
+            if 'goal' in row:
+                self.controllers[-1].goal = row['goal']
 
-        for robot_node in blueprint.findall('./robot'):
-            robot_type = robot_node.get('type')
-            supervisor = robot_node.find('./supervisor').get('type')
-            pose = get_pose(robot_node)
-            self.add_robot(robot_type, supervisor, pose)
+            if 'sensor_model' in row:
+                robot.set_sensor_model(row['sensor_model'], row['sensor_rays'])
 
-        for obstacle_node in blueprint.findall('./obstacle'):
-            pose = get_pose(obstacle_node)
-            points = obstacle_node.findall('./geometry/point')
-            geometry = [(get_float(p, 'x'), get_float(p, 'y')) for p in points]
-            self.add_obstacle(pose, geometry)
+        for pose, geometry in blueprint.iter_obstacles():
+            self.add_obstacle(Pose2D(*pose), geometry)
 
     def add_robot(self, robot_type, supervisor, pose):
-        robot = self._lookup_class(robots, robot_type)(pose)
-        controller = self._lookup_class(controllers, supervisor)()
+        robot = self._lookup_class('robots', robot_type)(pose)
+        controller = self._lookup_class('controllers', supervisor)()
         controller.attach_robot(robot, pose)
 
         self.robots.append(robot)
@@ -61,79 +64,387 @@ class World(object):
 
         self.application.add_controller(controller)
 
+        return robot
+
     def add_obstacle(self, pose, geometry):
         self.obstacles.append(Obstacle(pose, geometry))
 
 
 class Physics(object):
-    def __init__(self, world):
+    """
+    Collision detection and proximity sensing for a World.
+
+    With swept set, collisions are checked continuously along each robot's
+    motion since the previous check instead of only at its current pose, so
+    that fast robots or large time steps cannot tunnel through thin
+    obstacles. contact_fraction then tells how far into that motion the
+    first contact happened. The motion is taken to run straight from the
+    previous pose to the current one, as the 'euler' integrator moves; the
+    curved paths of the other integrators can bulge outside the swept
+    surface when a robot turns sharply within one check.
+
+    With field_resolution set, the static obstacles are also rasterized
+    into a DistanceField at that resolution when they are indexed. Robots
+    and sensors the field shows to be clear of every obstacle then skip the
+    exact polygon tests against obstacles altogether.
+
+    With lazy_sensors set, the proximity sensors are only marked stale in
+    each step, and a sensor's range is computed the first time it is read
+    afterwards, from the world as it is then. Readings the controllers
+    ignore are never computed. Set lazy_sensors to False to compute every
+    range during the step instead.
+    """
+
+    # bisection steps used to refine the time of impact
+    _bisections = 12
+
+    def __init__(self, world, cell_size=None, swept=False, field_resolution=None, lazy_sensors=True):
         self._world = world
-
-    def apply_physics(self):
-        if self._body_collision_detection():
+        self.swept = swept
+        self.lazy_sensors = lazy_sensors
+        self._robots_moved = False
+        self._field_resolution = field_resolution
+        self._distance_field = None
+        self.contact_fraction = None
+        self._previous_poses = self._current_poses()
+        self._moves = {}
+        self._cell_size = cell_size
+        self._obstacle_index = None
+        self._indexed_obstacles = 0
+        self._robot_index = None
+        self.profiler = None
+
+    def apply_physics(self, collisions=True, sensors=True):
+        """
+        Check for collisions and then update the proximity sensors, unless
+        there was a collision. Returns whether there was one.
+        """
+        if not (collisions or sensors):
+            return False
+
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.clock()
+
+        self._update_indices()
+        self.contact_fraction = None
+
+        collision = False
+        if collisions:
+            if self.swept:
+                collision = self._swept_collision_detection()
+                self._previous_poses = self._current_poses()
+            else:
+                collision = self._body_collision_detection()
+                if collision:
+                    self.contact_fraction = 1.0
+
+        if profiler is not None:
+            start = profiler.lap('collisions', start)
+
+        if collision:
+            print 'COLLISION!'
             return True
 
-        self._proximity_sensor_detection()
+        if sensors:
+            self._update_proximity_sensors()
+
+        if profiler is not None:
+            profiler.lap('sensors', start)
+
         return False
 
-    def _body_collision_detection(self):
+    def _update_indices(self):
+        # Obstacles are static, so their grid is only rebuilt when obstacles
+        # are added to the world. Robots move and are re-indexed every step.
+        obstacles = self._world.obstacles
+
+        if self._obstacle_index is None or self._indexed_obstacles != len(obstacles):
+            cell_size = self._cell_size
+            if cell_size is None:
+                cell_size = suggest_cell_size([x.get_bounds().get_bounding_box() for x in obstacles])
+
+            self._obstacle_index = UniformGrid(cell_size)
+            for obstacle in obstacles:
+                self._obstacle_index.insert(obstacle, obstacle.get_bounds().get_bounding_box())
+
+            self._indexed_obstacles = len(obstacles)
+            self._robot_index = UniformGrid(cell_size)
+
+            if self._field_resolution is not None:
+                self._distance_field = DistanceField([x.get_bounds() for x in obstacles], self._field_resolution)
+
+        self._robot_index.clear()
         for robot in self._world.robots:
+            bounds = robot.get_bounds()
+
+            if self.swept:
+                end = robot.get_pose()
+                start = self._previous_poses.get(id(robot), end)
+                if (start.x, start.y, start.theta) != (end.x, end.y, end.theta):
+                    bounds = bounds.swept_by(start, end)
+                self._moves[id(robot)] = (start, end, bounds)
+
+            self._robot_index.insert(robot, bounds.get_bounding_box())
+
+        self._robots_moved = False
+
+    def _active_robots(self):
+        # the robots whose collisions and sensors this instance handles;
+        # any others are only obstacles to them
+        return self._world.robots
+
+    def _obstacles_near(self, bounding_box, point, radius):
+        # obstacles that may lie within radius of point, the distance field
+        # permitting
+        field = self._distance_field
+        if field is not None and field.is_clear(point, radius):
+            return []
+        return self._obstacle_index.query(bounding_box)
+
+    def robots_moved(self):
+        """Note that the robots moved since the last apply_physics."""
+        self._robots_moved = True
+
+    def reset_motion(self):
+        """
+        Take the current poses as the start of the next swept check, e.g.
+        after robots were teleported.
+        """
+        self._previous_poses = self._current_poses()
+
+    def _current_poses(self):
+        return dict((id(x), x.get_pose()) for x in self._world.robots)
+
+    def _overlaps(self, surface_a, surface_b):
+        overlapping = surface_a.overlaps(surface_b)
+        if self.profiler is not None:
+            self.profiler.count_overlap(surface_a, surface_b, overlapping)
+        return overlapping
+
+    def _body_collision_detection(self):
+        profiler = self.profiler
+        order = dict((id(x), i) for i, x in enumerate(self._world.robots))
+
+        for robot in self._active_robots():
             robot_bounds = robot.get_bounds()
+            bounding_box = robot_bounds.get_bounding_box()
             
             # check against obstacles
-            for obstacle in self._world.obstacles:
+            for obstacle in self._obstacles_near(bounding_box, robot_bounds._centroid, robot_bounds._geometric_span / 2):
                 obstacle_bounds = obstacle.get_bounds()
 
-                if robot_bounds.precheck_surface(obstacle_bounds):
-                    points = robot_bounds.intersection_with_surface(obstacle_bounds)
-                    if len(points) > 0:
-                        print 'COLLISION!'
-                        return True
+                passed = robot_bounds.precheck_surface(obstacle_bounds)
+                if profiler is not None:
+                    profiler.count_precheck(passed)
+
+                if passed and self._overlaps(robot_bounds, obstacle_bounds):
+                    return True
             
-            # check against other robots
-            for other_robot in self._world.robots:
-                if other_robot == robot:
+            # check against other robots, each pair only once
+            for other_robot in self._robot_index.query(bounding_box):
+                if order[id(other_robot)] <= order[id(robot)]:
                     continue
 
                 other_robot_bounds = other_robot.get_bounds()
 
-                if robot_bounds.precheck_surface(other_robot_bounds):
-                    points = robot_bounds.intersection_with_surface(other_robot_bounds)
-                    if len(points) > 0:
-                        print 'COLLISION!'
-                        return True
+                passed = robot_bounds.precheck_surface(other_robot_bounds)
+                if profiler is not None:
+                    profiler.count_precheck(passed)
+
+                if passed and self._overlaps(robot_bounds, other_robot_bounds):
+                    return True
 
         return False
 
-    def _proximity_sensor_detection(self):
+    def _swept_collision_detection(self):
+        profiler = self.profiler
+        order = dict((id(x), i) for i, x in enumerate(self._world.robots))
+        first = None
+
         for robot in self._world.robots:
+            start, end, swept = self._moves[id(robot)]
+            body = robot.get_bounds()
+            bounding_box = swept.get_bounding_box()
+
+            # check against obstacles
+            for obstacle in self._obstacles_near(bounding_box, swept._centroid, swept._geometric_span / 2):
+                obstacle_bounds = obstacle.get_bounds()
+
+                passed = swept.precheck_surface(obstacle_bounds)
+                if profiler is not None:
+                    profiler.count_precheck(passed)
+
+                if passed and self._overlaps(swept, obstacle_bounds):
+                    t = self._time_of_impact(body, start, end, obstacle_bounds)
+                    if t is not None and (first is None or t < first):
+                        first = t
+
+            # check against other robots, each pair only once
+            for other_robot in self._robot_index.query(bounding_box):
+                if order[id(other_robot)] <= order[id(robot)]:
+                    continue
+
+                other_start, other_end, other_swept = self._moves[id(other_robot)]
+
+                passed = swept.precheck_surface(other_swept)
+                if profiler is not None:
+                    profiler.count_precheck(passed)
+
+                if passed and self._overlaps(swept, other_swept):
+                    t = self._time_of_impact(body, start, end, other_robot.get_bounds(), other_start, other_end)
+                    if t is not None and (first is None or t < first):
+                        first = t
+
+        if first is None:
+            return False
+
+        self.contact_fraction = first
+        return True
+
+    def _time_of_impact(self, body, start, end, other, other_start=None, other_end=None):
+        """
+        Return the fraction of the motion of body from start to end at which
+        it first touches other, which may itself be moving, or None.
+        """
+        # Sample the motion finely enough that no point of either surface
+        # moves more than half the width of the narrower moving one between
+        # samples, then bisect between the last clear sample and the first
+        # touching one.
+        width, radius = body.get_local_extent()
+        travel = hypot(end.x - start.x, end.y - start.y) + radius * abs(end.theta - start.theta)
+
+        if other_start is not None:
+            other_width, other_radius = other.get_local_extent()
+            width = min(width, other_width)
+            travel += hypot(other_end.x - other_start.x, other_end.y - other_start.y) + \
+                other_radius * abs(other_end.theta - other_start.theta)
+
+        samples = max(1, int(ceil(travel / (width / 2))))
+
+        def touching(t):
+            a = body.at_pose(interpolate_poses(start, end, t))
+            if other_start is None:
+                return self._overlaps(a, other)
+            return self._overlaps(a, other.at_pose(interpolate_poses(other_start, other_end, t)))
+
+        previous = None
+        for i in xrange(samples + 1):
+            t = float(i) / samples
+            if touching(t):
+                if previous is None:
+                    return 0.0
+
+                low, high = previous, t
+                for _ in xrange(self._bisections):
+                    middle = (low + high) / 2
+                    if touching(middle):
+                        high = middle
+                    else:
+                        low = middle
+                return high
+            previous = t
+
+        return None
+
+    def _update_proximity_sensors(self):
+        if self.lazy_sensors:
+            for robot in self._active_robots():
+                for ir_sensor in robot.ir_sensors:
+                    ir_sensor.defer(partial(self._resolve_proximity_sensor, robot, ir_sensor))
+        else:
+            self._proximity_sensor_detection()
+
+    def _proximity_sensor_detection(self):
+        for robot in self._active_robots():
             for ir_sensor in robot.ir_sensors:
-                d_min = ir_sensor.max_range
-                ir_sensor.update_range(d_min)
-                ir_bounds = ir_sensor.get_bounds()
-
-                # check against obstacles
-                for obstacle in self._world.obstacles:
-                    obstacle_bounds = obstacle.get_bounds()
-                    
-                    if ir_bounds.precheck_surface(obstacle_bounds):
-                        d_min = self._update_proximity_sensor(ir_sensor, ir_bounds, obstacle_bounds, d_min)
-
-                # check against other robots
-                for other_robot in self._world.robots:
-                    if other_robot == robot:
-                        continue
-
-                    other_robot_bounds = other_robot.get_bounds()
-                    
-                    if ir_bounds.precheck_surface(other_robot_bounds):
-                        d_min = self._update_proximity_sensor(ir_sensor, ir_bounds, other_robot_bounds, d_min)
-                
-                if d_min < ir_sensor.max_range:
-                    ir_sensor.update_range(d_min)
+                if ir_sensor.model == 'rays':
+                    self._ray_sensor_detection(robot, ir_sensor)
+                else:
+                    self._cone_sensor_detection(robot, ir_sensor)
+
+    def _resolve_proximity_sensor(self, robot, ir_sensor):
+        # the robot index is only current while nothing has moved
+        if self._robots_moved:
+            self._update_indices()
+
+        if ir_sensor.model == 'rays':
+            self._ray_sensor_detection(robot, ir_sensor)
+        else:
+            self._cone_sensor_detection(robot, ir_sensor)
+
+    def _cone_sensor_detection(self, robot, ir_sensor):
+        profiler = self.profiler
+
+        d_min = ir_sensor.max_range
+        ir_sensor.update_range(d_min)
+        ir_bounds = ir_sensor.get_bounds()
+        bounding_box = ir_bounds.get_bounding_box()
+
+        # check against obstacles; the cone lies within max_range of its apex
+        for obstacle in self._obstacles_near(bounding_box, ir_bounds.geometry[0], ir_sensor.max_range):
+            obstacle_bounds = obstacle.get_bounds()
+            
+            passed = ir_bounds.precheck_surface(obstacle_bounds)
+            if profiler is not None:
+                profiler.count_precheck(passed)
+
+            if passed:
+                d_min = self._update_proximity_sensor(ir_sensor, ir_bounds, obstacle_bounds, d_min)
+
+        # check against other robots
+        for other_robot in self._robot_index.query(bounding_box):
+            if other_robot == robot:
+                continue
+
+            other_robot_bounds = other_robot.get_bounds()
+            
+            passed = ir_bounds.precheck_surface(other_robot_bounds)
+            if profiler is not None:
+                profiler.count_precheck(passed)
+
+            if passed:
+                d_min = self._update_proximity_sensor(ir_sensor, ir_bounds, other_robot_bounds, d_min)
+        
+        if d_min < ir_sensor.max_range:
+            ir_sensor.update_range(d_min)
+
+    def _ray_sensor_detection(self, robot, ir_sensor):
+        profiler = self.profiler
+        origin, directions, bounding_box = ir_sensor.get_rays()
+
+        field = self._distance_field
+        if field is not None and all(field.trace(origin, x, ir_sensor.max_range) is None for x in directions):
+            candidates = []
+        else:
+            candidates = [x.get_bounds() for x in self._obstacle_index.query(bounding_box)]
+        candidates += [x.get_bounds() for x in self._robot_index.query(bounding_box) if x != robot]
+
+        d_min = ir_sensor.max_range
+        for bounds in candidates:
+            passed = bounding_boxes_overlap(bounding_box, bounds.get_bounding_box())
+            if profiler is not None:
+                profiler.count_precheck(passed)
+
+            if not passed:
+                continue
+
+            for direction in directions:
+                # only hits closer than the best so far can change the range
+                d = bounds.ray_intersection(origin, direction, d_min)
+                if profiler is not None:
+                    profiler.add_counts(edge_tests=len(bounds._edge_set), intersections=int(d is not None))
+
+                if d is not None:
+                    d_min = d
+
+        ir_sensor.update_range(d_min)
 
     def _update_proximity_sensor(self, sensor, sensor_bounds, obstacle_bounds, d_min):
         points = sensor_bounds.intersection_with_surface(obstacle_bounds)
+        if self.profiler is not None:
+            self.profiler.count_intersection(sensor_bounds, obstacle_bounds, points)
+
         for point in points:
 #            d = norm(pt-sensor_surface.geometry_(1,1:2));
             d = sqrt((point[0] - sensor_bounds.geometry[0][0]) ** 2 + (point[1] - sensor_bounds.geometry[0][1]) ** 2)
@@ -143,23 +454,242 @@ class Physics(object):
         return d_min
 
 
+class Snapshot(object):
+    """Compressed copy of the complete state of a Simulator at some time."""
+
+    def __init__(self, time, data):
+        self.time = time
+        self._data = data
+
+    def __len__(self):
+        return len(self._data)
+
+
 class Simulator(object):
-    def __init__(self, world, time_step):
+    """
+    Steps the controllers, robots, application and physics of a World.
+
+    By default everything runs once per time_step. rates can instead give
+    the update rate in Hz of 'controllers', 'sensors' and 'collisions'; each
+    is rounded to a whole number of time steps and the component only runs
+    on the steps where it is due, counting from the first. Sensors updated
+    less often than every step are evaluated eagerly, whatever the physics
+    was configured with, so that their ranges are those of the sample tick.
+    The robot dynamics can be split into dynamics_substeps per time step,
+    which must divide it into whole microseconds.
+
+    With batch_controllers the supervisors are executed together by a
+    controllers.batch.SupervisorBatch, whose results equal those of the
+    supervisors run one by one to within rounding.
+    """
+
+    components = ['controllers', 'sensors', 'collisions']
+
+    def __init__(self, world, time_step, physics=Physics, fleet=False, integrator=None, rates=None, dynamics_substeps=1, swept_collisions=False, batch_controllers=False):
         self._time_step = time_step
         self.time = timedelta(0)
         self._world = world
-        self._physics = Physics(world)
+        self._physics = physics(world, swept=swept_collisions)
         self.has_crashed = False
+        self.collision_time = None
+
+        self._tick = 0
+        self._periods = dict.fromkeys(self.components, 1)
+        for component, rate in (rates or {}).iteritems():
+            if component not in self._periods:
+                raise ValueError('unknown component: {}'.format(component))
+            self._periods[component] = max(1, int(round(1.0 / (rate * time_step.total_seconds()))))
+
+        # A lazy range is computed from the world when it is read, which is
+        # the world of the sample tick only if the sensors run every step.
+        if self._periods['sensors'] != 1:
+            self._physics.lazy_sensors = False
+
+        # timedelta division rounds down to whole microseconds, which would
+        # make the robots lag behind time
+        if dynamics_substeps < 1 or (time_step / dynamics_substeps) * dynamics_substeps != time_step:
+            raise ValueError('time step of {} cannot be split into {} equal substeps'.format(time_step, dynamics_substeps))
+
+        self._dynamics_substeps = dynamics_substeps
+        self._substep = time_step / dynamics_substeps
+
+        if integrator is not None:
+            for robot in world.robots:
+                robot.dynamics.set_integrator(integrator)
+
+        # In fleet mode the robots' state is kept in shared arrays and their
+        # dynamics are integrated in one vectorized call per step.
+        self._fleet = None
+        if fleet:
+            from robots.fleet import Fleet
+            self._fleet = Fleet(world.robots)
+
+        self._controller_batch = None
+        if batch_controllers:
+            from controllers.batch import SupervisorBatch
+            self._controller_batch = SupervisorBatch(world.controllers)
+
+        self.profiler = None
+
+        self._observers = []
+
+        self.snapshots = None
+        self._snapshot_interval = None
+        self._last_snapshot_time = None
+
+    def snapshot(self):
+        world = self._world
+        state = {
+            'time': self.time,
+            'tick': self._tick,
+            'has_crashed': self.has_crashed,
+            'collision_time': self.collision_time,
+            'application': world.application.get_state(),
+            'robots': [x.get_state() for x in world.robots],
+            'controllers': [x.get_state() for x in world.controllers]
+        }
+
+        return Snapshot(self.time, zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+
+    def restore(self, snapshot):
+        """
+        Return the simulation to the state captured in snapshot. Automatic
+        snapshots taken after it are discarded.
+        """
+        state = pickle.loads(zlib.decompress(snapshot._data))
+        world = self._world
+
+        self.time = state['time']
+        self._tick = state['tick']
+        self.has_crashed = state['has_crashed']
+        self.collision_time = state['collision_time']
+        world.application.set_state(state['application'])
+
+        for robot, robot_state in zip(world.robots, state['robots']):
+            robot.set_state(robot_state)
+
+        self._physics.reset_motion()
+
+        for controller, controller_state in zip(world.controllers, state['controllers']):
+            controller.set_state(controller_state)
+
+        if self.snapshots is not None:
+            while self.snapshots and self.snapshots[-1].time > self.time:
+                self.snapshots.pop()
+            self._last_snapshot_time = self.snapshots[-1].time if self.snapshots else self.time
+
+    def enable_snapshots(self, interval, capacity=100):
+        """
+        Take a snapshot now and then every interval (a timedelta) of
+        simulated time, keeping the latest capacity of them in snapshots.
+        """
+        self.snapshots = deque(maxlen=capacity)
+        self._snapshot_interval = interval
+        self._take_snapshot()
+
+    def rewind(self):
+        """
+        Restore the latest automatic snapshot taken before the current time,
+        or the oldest one kept if there is none. Returns the snapshot, or None
+        if snapshots are not enabled.
+        """
+        if not self.snapshots:
+            return None
+
+        earlier = [x for x in self.snapshots if x.time < self.time]
+        snapshot = earlier[-1] if earlier else self.snapshots[0]
+        self.restore(snapshot)
+        return snapshot
+
+    def _take_snapshot(self):
+        self.snapshots.append(self.snapshot())
+        self._last_snapshot_time = self.time
+
+    def enable_profiling(self, profiler=None):
+        """Start recording per-phase timings and counters; returns the profiler."""
+        if profiler is None:
+            from profiling import StepProfiler
+            profiler = StepProfiler()
+
+        self.profiler = profiler
+        self._physics.profiler = profiler
+        return profiler
+
+    def disable_profiling(self):
+        self.profiler = None
+        self._physics.profiler = None
+
+    def add_observer(self, observer):
+        """Have observer(simulator) called at the end of every step."""
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        self._observers.remove(observer)
+
+    def get_period(self, component):
+        """Return the time between updates of component, as a timedelta."""
+        return self._time_step * self._periods[component]
+
+    def _is_due(self, component):
+        return self._tick % self._periods[component] == 0
+
+    def step(self, controllers=True):
+        """
+        Advance the simulation by one time step. With controllers False the
+        controllers are not run, so the caller can drive the robots directly.
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.clock()
+
+        if controllers and self._is_due('controllers'):
+            controller_time_step = self._time_step * self._periods['controllers']
+            if self._controller_batch is not None:
+                self._controller_batch.execute(controller_time_step)
+            else:
+                for controller in self._world.controllers:
+                    controller.execute(controller_time_step)
+
+        if profiler is not None:
+            start = profiler.lap('controllers', start)
+
+        for _ in xrange(self._dynamics_substeps):
+            if self._fleet is not None:
+                self._fleet.execute(self._substep)
+            else:
+                for robot in self._world.robots:
+                    robot.execute(self._substep)
+
+        self._physics.robots_moved()
+
+        if profiler is not None:
+            start = profiler.lap('robots', start)
 
-    def step(self):
-        for controller in self._world.controllers:
-            controller.execute(self._time_step)
+        self._world.application.run(self._time_step)
 
-        for robot in self._world.robots:
-            robot.execute(self._time_step)
+        if profiler is not None:
+            profiler.lap('application', start)
 
-        self._world.application.run(self._time_step)
+        if not self.has_crashed:
+            self.has_crashed = self._physics.apply_physics(
+                collisions=self._is_due('collisions'),
+                sensors=self._is_due('sensors'))
 
-        self.has_crashed = self.has_crashed or self._physics.apply_physics()
+            if self.has_crashed:
+                # contact_fraction is relative to the motion since the
+                # previous collision check
+                period = self.get_period('collisions')
+                self.collision_time = self.time + self._time_step - \
+                    timedelta(seconds=period.total_seconds() * (1 - self._physics.contact_fraction))
 
         self.time += self._time_step
+        self._tick += 1
+
+        if self.snapshots is not None and self.time - self._last_snapshot_time >= self._snapshot_interval:
+            self._take_snapshot()
+
+        for observer in self._observers:
+            observer(self)
+
+        if profiler is not None:
+            profiler.end_step(self.time)
@@ -0,0 +1,58 @@
+
+from math import floor
+
+
+class UniformGrid(object):
+    """
+    Broad-phase spatial index that buckets items by the grid cells their
+    axis-aligned bounding boxes overlap.
+
+    Bounding boxes are (min_x, min_y, max_x, max_y) tuples, as returned by
+    Surface2D.get_bounding_box. Only occupied cells are stored, so the grid
+    has no fixed extent.
+    """
+
+    def __init__(self, cell_size):
+        self._cell_size = float(cell_size)
+        self._cells = {}
+
+    def __len__(self):
+        return len(self._cells)
+
+    def clear(self):
+        self._cells.clear()
+
+    def insert(self, item, bounding_box):
+        for cell in self._covered_cells(bounding_box):
+            self._cells.setdefault(cell, []).append(item)
+
+    def query(self, bounding_box):
+        """Return the items whose cells overlap bounding_box, each only once."""
+        candidates = []
+        seen = set()
+
+        for cell in self._covered_cells(bounding_box):
+            for item in self._cells.get(cell, ()):
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    candidates.append(item)
+
+        return candidates
+
+    def _covered_cells(self, bounding_box):
+        s = self._cell_size
+        min_i = int(floor(bounding_box[0] / s))
+        min_j = int(floor(bounding_box[1] / s))
+        max_i = int(floor(bounding_box[2] / s))
+        max_j = int(floor(bounding_box[3] / s))
+
+        return [(i, j) for i in xrange(min_i, max_i + 1) for j in xrange(min_j, max_j + 1)]
+
+
+def suggest_cell_size(bounding_boxes, minimum=0.25):
+    """Pick a cell size around the typical extent of the given boxes."""
+    if not bounding_boxes:
+        return minimum
+
+    extents = sorted(max(b[2] - b[0], b[3] - b[1]) for b in bounding_boxes)
+    return max(extents[len(extents) // 2], minimum)
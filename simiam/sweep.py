@@ -0,0 +1,207 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import random
+import sys
+from datetime import timedelta
+from math import sqrt
+from geometry import Pose2D
+from headless import create_simulator
+
+
+# parameters that can be swept; the start pose and goal are those of the
+# first robot
+parameters = ['kp', 'ki', 'kd', 'v', 'd_c', 'd_s', 'x', 'y', 'theta', 'goal_x', 'goal_y']
+
+metrics = ['time_to_goal', 'crashed', 'path_length', 'min_obstacle_distance']
+
+
+def configurations(grid=None, ranges=None, samples=1, seed=None):
+    """
+    Return the list of parameter dicts to run: every combination of the
+    values in grid, each with samples draws from the uniform (low, high)
+    ranges if any are given.
+    """
+    grid = grid or {}
+    ranges = ranges or {}
+
+    for name in itertools.chain(grid, ranges):
+        if name not in parameters:
+            raise ValueError('unknown parameter: {}'.format(name))
+
+    names = sorted(grid)
+    points = [dict(zip(names, x)) for x in itertools.product(*[grid[n] for n in names])]
+
+    if not ranges:
+        return points
+
+    rng = random.Random(seed)
+    configs = []
+    for point in points:
+        for _ in xrange(samples):
+            config = dict(point)
+            for name in sorted(ranges):
+                config[name] = rng.uniform(*ranges[name])
+            configs.append(config)
+
+    return configs
+
+
+def configure(world, params):
+    robot = world.robots[0]
+    supervisor = world.controllers[0]
+
+    supervisor.set_gains(params.get('kp'), params.get('ki'), params.get('kd'))
+
+    for name in ['v', 'd_c', 'd_s']:
+        if name in params:
+            setattr(supervisor, name, params[name])
+
+    if any(x in params for x in ['x', 'y', 'theta']):
+        pose = robot.get_pose()
+        pose = Pose2D(params.get('x', pose.x), params.get('y', pose.y), params.get('theta', pose.theta))
+        robot.set_pose(pose)
+        supervisor.attach_robot(robot, pose)
+
+    if 'goal_x' in params or 'goal_y' in params:
+        supervisor.goal = (params.get('goal_x', supervisor.goal[0]), params.get('goal_y', supervisor.goal[1]))
+
+
+def run_configuration(filename, params, time_step=timedelta(milliseconds=10), duration=timedelta(seconds=60)):
+    """
+    Run one configuration until the first robot reaches its goal, a robot
+    crashes or duration has passed, and return its metrics.
+    """
+    simulator = create_simulator(filename, time_step)
+    world = simulator._world
+    configure(world, params)
+
+    robot = world.robots[0]
+    supervisor = world.controllers[0]
+
+    pose = robot.get_pose()
+    path_length = 0.0
+    min_distance = _obstacle_distance(robot, world.obstacles, None)
+    time_to_goal = None
+
+    while simulator.time < duration:
+        simulator.step()
+
+        previous, pose = pose, robot.get_pose()
+        path_length += sqrt((pose.x - previous.x) ** 2 + (pose.y - previous.y) ** 2)
+        min_distance = _obstacle_distance(robot, world.obstacles, min_distance)
+
+        if simulator.has_crashed:
+            break
+
+        if supervisor.reached_goal:
+            time_to_goal = simulator.time.total_seconds()
+            break
+
+    return {
+        'time_to_goal': time_to_goal,
+        'crashed': simulator.has_crashed,
+        'path_length': path_length,
+        'min_obstacle_distance': min_distance
+    }
+
+
+def _obstacle_distance(robot, obstacles, best):
+    # smallest distance from the robot to an obstacle, if below best;
+    # obstacles whose bounding box is already further away are skipped
+    bounds = robot.get_bounds()
+    box = bounds.get_bounding_box()
+
+    for obstacle in obstacles:
+        other = obstacle.get_bounding_box()
+        gap = max(other[0] - box[2], box[0] - other[2], other[1] - box[3], box[1] - other[3], 0)
+        if best is not None and gap >= best:
+            continue
+
+        d = bounds.distance_to(obstacle)
+        if best is None or d < best:
+            best = d
+
+    return best
+
+
+class _NullWriter(object):
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def _run_task(task):
+    index, filename, params, time_step, duration = task
+
+    # Physics prints every collision; keep that out of the CSV rows when
+    # they go to standard output.
+    stdout = sys.stdout
+    sys.stdout = _NullWriter()
+    try:
+        return index, params, run_configuration(filename, params, time_step, duration)
+    finally:
+        sys.stdout = stdout
+
+
+def sweep(filename, configs, output, processes=None, time_step=timedelta(milliseconds=10), duration=timedelta(seconds=60)):
+    """
+    Run every configuration on a pool of processes (one per core by
+    default), writing a CSV row to output as each one finishes.
+    """
+    names = sorted(set(name for config in configs for name in config))
+    writer = csv.writer(output)
+    writer.writerow(['run'] + names + metrics)
+    output.flush()
+
+    tasks = [(i, filename, config, time_step, duration) for i, config in enumerate(configs)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        for index, params, result in pool.imap_unordered(_run_task, tasks):
+            writer.writerow([index] + [params.get(n, '') for n in names] + ['' if result[m] is None else result[m] for m in metrics])
+            output.flush()
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a Sim.I.am simulation for many controller and scenario parameters.')
+    parser.add_argument('settings', nargs='?', default='settings.xml', help='world description (default: settings.xml)')
+    parser.add_argument('-g', '--grid', action='append', default=[], metavar='NAME=V1,V2,...', help='values of a parameter to try in every combination')
+    parser.add_argument('-u', '--uniform', action='append', default=[], metavar='NAME=LOW:HIGH', help='range to sample a parameter from uniformly')
+    parser.add_argument('-s', '--samples', type=int, default=10, help='random samples per grid point, with --uniform (default: 10)')
+    parser.add_argument('--seed', type=int, help='random seed for --uniform')
+    parser.add_argument('-d', '--duration', type=float, default=60, help='simulated time limit per run, in seconds (default: 60)')
+    parser.add_argument('-t', '--time-step', type=float, default=10, help='simulation time step, in milliseconds (default: 10)')
+    parser.add_argument('-j', '--processes', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('-o', '--output', help='CSV file to write the results to (default: standard output)')
+    args = parser.parse_args(argv)
+
+    grid = {}
+    ranges = {}
+    try:
+        for spec in args.grid:
+            name, _, values = spec.partition('=')
+            grid[name] = [float(x) for x in values.split(',')]
+        for spec in args.uniform:
+            name, _, values = spec.partition('=')
+            low, high = values.split(':')
+            ranges[name] = (float(low), float(high))
+
+        configs = configurations(grid, ranges, args.samples, args.seed)
+    except ValueError as e:
+        parser.error('invalid parameter spec: {} (parameters are {})'.format(e, ', '.join(parameters)))
+
+    output = open(args.output, 'wb') if args.output is not None else sys.stdout
+    try:
+        sweep(args.settings, configs, output, args.processes,
+              timedelta(milliseconds=args.time_step), timedelta(seconds=args.duration))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return 0
@@ -3,10 +3,19 @@ import Tkinter as tk
 from PIL import Image, ImageTk
 from datetime import timedelta
 from simulator import World, Simulator
+from scheduler import SimulationThread
 
 class AppWindow(object):
+    # the simulation runs on its own thread; the UI samples it at ~30 fps
+    _frame_interval = 33
+
+    _speeds = [
+        ('1x', 1.0),
+        ('10x', 10.0),
+        ('Max', None)
+    ]
+
     def __init__(self):
-        self._is_playing = False
         self._images = {}
 
         self._create_layout()
@@ -25,19 +34,25 @@ class AppWindow(object):
         world = World()
         world.build_from_file('settings.xml')
         self._simulator = Simulator(world, timedelta(milliseconds=10))
+        self._simulator.enable_snapshots(timedelta(seconds=1))
+        self._thread = SimulationThread(self._simulator)
         self._target = None
+        self._robot_items = None
 
     def _render(self):
-        self._view.delete(tk.ALL)
+        # Items are created once and then moved with coords(); the zoom is
+        # applied to the coordinates rather than by rebuilding the canvas.
+        if self._robot_items is None:
+            self._create_items()
 
-        # TODO: Grid lines
+        for robot, items in zip(self._simulator._world.robots, self._robot_items):
+            key = (robot.get_pose_version(), tuple(x.get_state() for x in robot.ir_sensors))
+            if key == items[0]:
+                continue
 
-        for obstacle in self._simulator._world.obstacles:
-            self._view.create_polygon(obstacle.geometry, fill='#ff6666')
-
-        for robot in self._simulator._world.robots:
-            for surface in robot.get_surfaces():
-                self._view.create_polygon(surface[0].geometry, fill=surface[1])
+            for item, surface in zip(items[1], robot.get_surfaces()):
+                self._view.coords(item, *self._to_view(surface[0].geometry))
+            items[0] = key
 
         if self._target is not None:
             size = 0.03
@@ -47,27 +62,47 @@ class AppWindow(object):
                 self._target[0] + size / 2,
                 self._target[1] + size / 2
             ]
-            self._view.create_oval(bbox, fill='green')
-
-        self._view.tag_bind('robot', '<Button-1>', self._focus_view)
-
-        self._view.scale(tk.ALL, 0, 0, self._zoom, self._zoom)
+            self._view.coords(self._target_item, *[x * self._zoom for x in bbox])
+            self._view.itemconfig(self._target_item, state=tk.NORMAL)
 
         if self._bounds is None:
             self._update_bounds()
             self._scroll_to(0.0, 0.0)
 
+    def _create_items(self):
+        self._view.delete(tk.ALL)
+
+        # TODO: Grid lines
+
+        for obstacle in self._simulator._world.obstacles:
+            self._view.create_polygon(self._to_view(obstacle.geometry), fill='#ff6666', tags='obstacle')
+
+        self._robot_items = []
+        for robot in self._simulator._world.robots:
+            items = [
+                self._view.create_polygon(self._to_view(surface[0].geometry), fill=surface[1], tags='robot')
+                for surface in robot.get_surfaces()]
+            self._robot_items.append([None, items])
+
+        self._target_item = self._view.create_oval(0, 0, 0, 0, fill='green', state=tk.HIDDEN)
+
+        self._view.tag_bind('robot', '<Button-1>', self._focus_view)
+
+    def _to_view(self, geometry):
+        zoom = self._zoom
+        return [c * zoom for p in geometry for c in p]
+
     def _update(self):
-        self._simulator.step()
-        self._set_time(self._simulator.time)
-        self._render()
+        with self._thread.lock:
+            self._set_time(self._simulator.time)
+            self._render()
+            crashed = self._simulator.has_crashed
 
-        if self._simulator.has_crashed:
-            self._is_playing = False
+        if crashed:
             self._status_icon.config(image=self._get_image('ui_status_error.png'))
+            self._buttons['play'].config(image=self._get_image('ui_control_play.png'))
 
-        if self._is_playing:
-            self._root.after(1, self._update)
+        self._root.after(self._frame_interval, self._update)
 
     def _create_layout(self):
         self._root = tk.Tk()
@@ -164,6 +199,11 @@ class AppWindow(object):
             image=self._get_image('ui_status_clock.png'),
             ).grid(row=0, column=9)
 
+        self._speed = tk.StringVar(self._root)
+        self._speed.set(self._speeds[0][0])
+        speed_menu = tk.OptionMenu(self._root, self._speed, *[x[0] for x in self._speeds], command=self._on_speed)
+        speed_menu.grid(row=0, column=0, columnspan=3)
+
         self._time_label = tk.Label(self._root)
         self._time_label.grid(row=0, column=10)
         self._set_time(timedelta(0))
@@ -173,27 +213,39 @@ class AppWindow(object):
         self._render()
 
     def _on_start(self):
-        self._is_playing = True
         self._buttons['play'].config(
             image=self._get_image('ui_control_pause.png'),
             command=self._on_play)
             
         self._buttons['home'].config(state=tk.NORMAL)
+        self._buttons['reset'].config(state=tk.NORMAL)
 
         self._set_time(timedelta(0))
 
-        self._update();
+        self._thread.start()
+        self._thread.play()
+        self._update()
 
     def _on_play(self):
-        self._is_playing = not self._is_playing
-        if self._is_playing:
+        if not self._thread.is_playing():
+            self._thread.play()
             self._buttons['play'].config(image=self._get_image('ui_control_pause.png'))
-            self._update()
         else:
+            self._thread.pause()
             self._buttons['play'].config(image=self._get_image('ui_control_play.png'))
 
+    def _on_speed(self, name):
+        self._thread.set_real_time_factor(dict(self._speeds)[name])
+
     def _on_reset(self):
-        pass
+        # rewind to the last snapshot; pressing again goes further back
+        with self._thread.lock:
+            if self._simulator.rewind() is None:
+                return
+
+            self._status_icon.config(image=self._get_image('ui_status_ok.png'))
+            self._set_time(self._simulator.time)
+            self._render()
 
     def _on_home(self):
         pass
@@ -203,13 +255,15 @@ class AppWindow(object):
         self._view.config(scrollregion=self._bounds)
 
     def _on_zoom_in(self):
-        self._zoom *= 1.25
-        self._render()
-        self._update_bounds()
+        self._set_zoom(self._zoom * 1.25)
 
     def _on_zoom_out(self):
-        self._zoom /= 1.25
-        self._render()
+        self._set_zoom(self._zoom / 1.25)
+
+    def _set_zoom(self, zoom):
+        factor = zoom / self._zoom
+        self._zoom = zoom
+        self._view.scale(tk.ALL, 0, 0, factor, factor)
         self._update_bounds()
 
     def _get_world_coords(self, event):
@@ -220,8 +274,9 @@ class AppWindow(object):
 
     def _set_target(self, event):
         self._target = self._get_world_coords(event)
-        self._simulator._world.application.set_goal(self._target)
-        self._render()
+        with self._thread.lock:
+            self._simulator._world.application.set_goal(self._target)
+            self._render()
 
     def _scroll_to(self, x_fraction, y_fraction):
         x_fraction = max(-1.0, min(1.0, x_fraction))
@@ -229,7 +284,8 @@ class AppWindow(object):
         self._scroll_thumb = (x_fraction, y_fraction)
         self._view.xview_moveto(x_fraction)
         self._view.yview_moveto(y_fraction)
-        self._render()
+        with self._thread.lock:
+            self._render()
 
     def _mouse_down(self, event):
         self._dragging = False
@@ -248,7 +304,7 @@ class AppWindow(object):
         self._scroll_to(self._scroll_thumb[0] + change[0] / width, self._scroll_thumb[1] + change[1] / height)
         self._drag_start = event.widget.canvasx(event.x), event.widget.canvasy(event.y)
 
-    def _focus_view(self):
+    def _focus_view(self, event=None):
         pass
 
     def _set_time(self, value):
@@ -0,0 +1,178 @@
+
+import numpy as np
+from simulator import Physics
+
+
+class VectorizedPhysics(Physics):
+    """
+    Physics backend that computes the proximity sensor ranges for a whole
+    step with batched NumPy array operations.
+
+    Every sensor cone edge and every obstacle and robot edge is packed into
+    arrays, all segment-segment intersections between surfaces that pass
+    the precheck are solved at once, and the minimum range is written back
+    to each sensor. Collision detection, and sensors using the 'rays' model,
+    are handled as in Physics, and only they make use of field_resolution;
+    the batched cone sensors do not consult the distance field. Sensors are evaluated eagerly by default,
+    since batching them is the point of this backend.
+    """
+
+    # upper bound on the number of sensor-body candidates and of edge pairs
+    # handled per batch, to keep the temporary arrays to a few tens of
+    # megabytes
+    _max_batch = 1 << 20
+
+    def __init__(self, world, cell_size=None, swept=False, field_resolution=None, lazy_sensors=False):
+        Physics.__init__(self, world, cell_size, swept, field_resolution, lazy_sensors)
+
+    def _proximity_sensor_detection(self):
+        robots = self._world.robots
+        obstacles = self._world.obstacles
+
+        sensors = []
+        sensor_owners = []
+        for i, robot in enumerate(robots):
+            for ir_sensor in robot.ir_sensors:
+                if ir_sensor.model == 'rays':
+                    self._ray_sensor_detection(robot, ir_sensor)
+                    continue
+
+                ir_sensor.update_range(ir_sensor.max_range)
+                sensors.append(ir_sensor)
+                sensor_owners.append(i)
+
+        if not sensors:
+            return
+
+        bodies = [x.get_bounds() for x in obstacles] + [x.get_bounds() for x in robots]
+        if not bodies:
+            return
+
+        body_owners = np.array([-1] * len(obstacles) + range(len(robots)))
+        sensor_owners = np.array(sensor_owners)
+
+        sensor_bounds = [x.get_bounds() for x in sensors]
+        cones = np.array([x.geometry for x in sensor_bounds], dtype=float)
+        n_cone = cones.shape[1]
+        cone_starts = cones.reshape(-1, 2)
+        cone_ends = np.roll(cones, -1, axis=1).reshape(-1, 2)
+        origins = cones[:, 0, :]
+
+        body_starts, body_ends, body_edges, body_offsets = self._pack_edges(bodies)
+
+        # broad phase, the same test as Surface2D.precheck_surface, for a
+        # block of sensors at a time so that the candidate matrix stays
+        # within _max_batch entries however many sensors and bodies there are
+        sensor_boxes = np.array([x.get_bounding_box() for x in sensor_bounds])
+        body_boxes = np.array([x.get_bounding_box() for x in bodies])
+
+        block = max(1, self._max_batch // len(bodies))
+        pair_sensors = []
+        pair_bodies = []
+        for first in xrange(0, len(sensors), block):
+            boxes = sensor_boxes[first:first + block]
+            candidates = (
+                (boxes[:, None, 0] <= body_boxes[None, :, 2]) &
+                (body_boxes[None, :, 0] <= boxes[:, None, 2]) &
+                (boxes[:, None, 1] <= body_boxes[None, :, 3]) &
+                (body_boxes[None, :, 1] <= boxes[:, None, 3]))
+            candidates &= sensor_owners[first:first + block, None] != body_owners[None, :]
+
+            s, b = np.nonzero(candidates)
+            pair_sensors.append(s + first)
+            pair_bodies.append(b)
+
+        pair_sensors = np.concatenate(pair_sensors)
+        pair_bodies = np.concatenate(pair_bodies)
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.add_counts(
+                prechecks=len(sensors) * len(bodies),
+                prechecks_passed=len(pair_sensors),
+                edge_tests=int((n_cone * body_edges[pair_bodies]).sum()))
+
+        if len(pair_sensors) == 0:
+            return
+
+        max_range = np.array([x.max_range for x in sensors])
+        min_range = np.array([x._min_range for x in sensors])
+        d_min = max_range.copy()
+
+        pair_counts = n_cone * body_edges[pair_bodies]
+        pair_ends = np.cumsum(pair_counts)
+
+        start = 0
+        while start < len(pair_sensors):
+            limit = (pair_ends[start - 1] if start > 0 else 0) + self._max_batch
+            end = max(start + 1, np.searchsorted(pair_ends, limit, side='right'))
+
+            s = pair_sensors[start:end]
+            b = pair_bodies[start:end]
+            counts = pair_counts[start:end]
+
+            # expand each (sensor, body) pair into all of its edge pairs
+            pair = np.repeat(np.arange(len(s)), counts)
+            local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            n_body = body_edges[b][pair]
+            edge_a = s[pair] * n_cone + local // n_body
+            edge_b = body_offsets[b][pair] + local % n_body
+
+            distances = self._intersection_distances(
+                cone_starts[edge_a], cone_ends[edge_a],
+                body_starts[edge_b], body_ends[edge_b],
+                origins[s[pair]])
+
+            hit = ~np.isnan(distances)
+            hit_sensors = s[pair][hit]
+
+            if profiler is not None:
+                profiler.add_counts(intersections=len(hit_sensors))
+
+            distances = np.clip(distances[hit], min_range[hit_sensors], max_range[hit_sensors])
+            np.minimum.at(d_min, hit_sensors, distances)
+
+            start = end
+
+        for i in np.nonzero(d_min < max_range)[0]:
+            sensors[i].update_range(d_min[i])
+
+    def _pack_edges(self, surfaces):
+        counts = np.array([len(x.geometry) for x in surfaces])
+        offsets = np.cumsum(counts) - counts
+
+        points = np.array([p for x in surfaces for p in x.geometry], dtype=float)
+        next_index = np.arange(len(points)) + 1
+        next_index[offsets + counts - 1] = offsets
+
+        return points, points[next_index], counts, offsets
+
+    def _intersection_distances(self, a_0, a_1, b_0, b_1, origins):
+        # same formulation as Surface2D.intersection_with_surface; returns the
+        # distance from the sensor origin to each intersection point, or NaN
+        # where the edges do not intersect
+        x_13 = a_0[:, 0] - b_0[:, 0]
+        y_13 = a_0[:, 1] - b_0[:, 1]
+
+        x_21 = a_1[:, 0] - a_0[:, 0]
+        y_21 = a_1[:, 1] - a_0[:, 1]
+
+        x_43 = b_1[:, 0] - b_0[:, 0]
+        y_43 = b_1[:, 1] - b_0[:, 1]
+
+        n_edge_a = x_43 * y_13 - y_43 * x_13
+        n_edge_b = x_21 * y_13 - y_21 * x_13
+        d_edge_ab = y_43 * x_21 - x_43 * y_21
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u_a = n_edge_a / d_edge_ab
+            u_b = n_edge_b / d_edge_ab
+
+        hit = (d_edge_ab != 0) & (u_a >= 0) & (u_a <= 1) & (u_b >= 0) & (u_b <= 1)
+
+        x = a_0[:, 0] + x_21 * u_a
+        y = a_0[:, 1] + y_21 * u_a
+
+        d = np.sqrt((x - origins[:, 0]) ** 2 + (y - origins[:, 1]) ** 2)
+        d[~hit] = np.nan
+        return d
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+
+_magic = 'SIMIAM-WORLD 1\n'
+
+default_cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'simiam')
+
+
+class Blueprint(object):
+    """
+    Contents of a world file: the application type, a table of robots as
+    dicts with 'type', 'supervisor', 'pose' (x, y, theta) and optionally
+    'goal' (x, y), 'sensor_model' and 'sensor_rays', and the obstacles.
+
+    The obstacles are kept flat, as a list of poses, the offsets into the
+    vertex list at which the geometry of each obstacle starts (plus the end
+    of the last) and the list of (x, y) vertices; these may also be
+    read-only NumPy arrays mapped from a compiled file.
+    """
+
+    def __init__(self, app, robots, obstacle_poses, vertex_offsets, vertices):
+        self.app = app
+        self.robots = robots
+        self.obstacle_poses = obstacle_poses
+        self.vertex_offsets = vertex_offsets
+        self.vertices = vertices
+
+    def iter_obstacles(self):
+        """Yield the (x, y, theta) pose and the list of vertices of each obstacle."""
+        poses = self.obstacle_poses
+        offsets = self.vertex_offsets
+        vertices = self.vertices
+
+        if hasattr(vertices, 'tolist'):
+            poses, offsets = poses.tolist(), offsets.tolist()
+            vertices = [tuple(x) for x in vertices.tolist()]
+
+        for i, pose in enumerate(poses):
+            yield tuple(pose), vertices[offsets[i]:offsets[i + 1]]
+
+
+def parse_xml(filename):
+    """Read an XML world file, streaming it so large files are never held whole."""
+    app = None
+    robots = []
+    obstacle_poses = []
+    vertex_offsets = [0]
+    vertices = []
+
+    def get_pose(node):
+        pose_node = node.find('./pose')
+        return tuple(float(pose_node.get(n)) for n in ['x', 'y', 'theta'])
+
+    root = None
+    depth = 0
+    for event, node in ET.iterparse(filename, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = node
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 1:
+            continue
+
+        # a complete child of the root
+        if node.tag == 'app':
+            app = node.get('type')
+        elif node.tag == 'robot':
+            robot = {
+                'type': node.get('type'),
+                'supervisor': node.find('./supervisor').get('type'),
+                'pose': get_pose(node)
+            }
+            goal = node.find('./goal')
+            if goal is not None:
+                robot['goal'] = (float(goal.get('x')), float(goal.get('y')))
+            if node.get('sensor_model') is not None:
+                robot['sensor_model'] = node.get('sensor_model')
+                robot['sensor_rays'] = int(node.get('sensor_rays', 3))
+            robots.append(robot)
+        elif node.tag == 'obstacle':
+            obstacle_poses.append(get_pose(node))
+            vertices.extend((float(p.get('x')), float(p.get('y'))) for p in node.findall('./geometry/point'))
+            vertex_offsets.append(len(vertices))
+
+        root.clear()
+
+    return Blueprint(app, robots, obstacle_poses, vertex_offsets, vertices)
+
+
+def write_compiled(blueprint, filename):
+    """
+    Write blueprint in the compiled format: a header with the application
+    and robot table as JSON, then the obstacle poses, vertex offsets and
+    vertices as flat little-endian arrays.
+    """
+    import numpy as np
+
+    header = _magic + json.dumps({
+        'app': blueprint.app,
+        'robots': blueprint.robots,
+        'obstacles': len(blueprint.obstacle_poses),
+        'vertices': len(blueprint.vertices)
+    })
+    # pad so that the arrays are aligned
+    header += ' ' * (15 - len(header) % 16) + '\n'
+
+    # write to a temporary file first, so that a reader never sees a
+    # partial file
+    partial = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(partial, 'wb') as f:
+        f.write(header)
+        np.asarray(blueprint.obstacle_poses, '<f8').reshape(-1, 3).tofile(f)
+        np.asarray(blueprint.vertex_offsets, '<i8').tofile(f)
+        np.asarray(blueprint.vertices, '<f8').reshape(-1, 2).tofile(f)
+    os.rename(partial, filename)
+
+
+def read_compiled(filename):
+    """Read a compiled world file, memory-mapping its obstacle arrays."""
+    import numpy as np
+
+    with open(filename, 'rb') as f:
+        if f.readline() != _magic:
+            raise ValueError('not a compiled world file: {}'.format(filename))
+        header = json.loads(f.readline())
+        offset = f.tell()
+
+    count = header['obstacles']
+    size = header['vertices']
+
+    def array(dtype, shape):
+        # np.memmap cannot map empty arrays
+        if not shape[0]:
+            return np.zeros(shape, dtype)
+        return np.memmap(filename, dtype, 'r', offset, shape)
+
+    poses = array('<f8', (count, 3))
+    offset += poses.nbytes
+    offsets = array('<i8', (count + 1,))
+    offset += offsets.nbytes
+    vertices = array('<f8', (size, 2))
+
+    robots = [dict((str(k), v) for k, v in x.iteritems()) for x in header['robots']]
+    for robot in robots:
+        robot['pose'] = tuple(robot['pose'])
+        if 'goal' in robot:
+            robot['goal'] = tuple(robot['goal'])
+        for key in ['type', 'supervisor', 'sensor_model']:
+            if key in robot:
+                robot[key] = str(robot[key])
+
+    return Blueprint(str(header['app']), robots, poses, offsets, vertices)
+
+
+def write_xml(blueprint, filename):
+    """Write blueprint as an XML world file, in the format of settings.xml."""
+    root = ET.Element('simulation')
+    ET.SubElement(root, 'app', type=blueprint.app)
+
+    def add_pose(node, pose):
+        ET.SubElement(node, 'pose', dict(zip(['x', 'y', 'theta'], [repr(float(x)) for x in pose])))
+
+    for row in blueprint.robots:
+        node = ET.SubElement(root, 'robot', type=row['type'])
+        if 'sensor_model' in row:
+            node.set('sensor_model', row['sensor_model'])
+            node.set('sensor_rays', str(row['sensor_rays']))
+        ET.SubElement(node, 'supervisor', type=row['supervisor'])
+        add_pose(node, row['pose'])
+        if 'goal' in row:
+            ET.SubElement(node, 'goal', x=repr(float(row['goal'][0])), y=repr(float(row['goal'][1])))
+
+    for pose, geometry in blueprint.iter_obstacles():
+        node = ET.SubElement(root, 'obstacle')
+        add_pose(node, pose)
+        geometry_node = ET.SubElement(node, 'geometry')
+        for x, y in geometry:
+            ET.SubElement(geometry_node, 'point', x=repr(float(x)), y=repr(float(y)))
+
+    ET.ElementTree(root).write(filename)
+
+
+def is_compiled(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(_magic)) == _magic
+
+
+def file_hash(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load(filename, cache_dir=None):
+    """
+    Read a world file, either XML or compiled. With cache_dir, XML files are
+    compiled into that directory under the hash of their contents, and
+    later loads of the same contents read the compiled file instead.
+    """
+    if is_compiled(filename):
+        return read_compiled(filename)
+
+    if cache_dir is None:
+        return parse_xml(filename)
+
+    cached = os.path.join(cache_dir, file_hash(filename) + '.world')
+    if os.path.exists(cached):
+        return read_compiled(cached)
+
+    blueprint = parse_xml(filename)
+    try:
+        os.makedirs(cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+    write_compiled(blueprint, cached)
+    return blueprint